@@ -16,6 +16,69 @@ along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 
-# Import the classes we want to present.
-from adm300parse import adm300parse
-from adm300comm import adm300comm
\ No newline at end of file
+import importlib
+import sys
+import types
+
+# The classes we want to present and the modules they live in. Modules are only imported the first time one of their classes is used, so tools that just parse don't pull in pyserial or threading.
+lazyExports = {
+    'adm300parse': 'adm300parse',
+    'adm300reading': 'adm300parse',
+    'adm300lazyReading': 'adm300parse',
+    'adm300comm': 'adm300comm',
+    'adm300mgr': 'adm300mgr',
+    'adm300history': 'adm300history',
+    'adm300archiveWriter': 'adm300archive',
+    'adm300archiveReader': 'adm300archive',
+    'adm300dispatch': 'adm300dispatch',
+    'adm300stats': 'adm300stats',
+    'adm300framer': 'adm300framer',
+    'adm300filter': 'adm300filter',
+    'adm300bulk': 'adm300bulk',
+    'adm300scheduler': 'adm300scheduler',
+    'adm300aggregator': 'adm300aggregate',
+    'adm300server': 'adm300server',
+    'adm300client': 'adm300server',
+    'adm300shmWriter': 'adm300shm',
+    'adm300shmReader': 'adm300shm'
+}
+
+# Classes we've already imported.
+lazyLoaded = {}
+
+class adm300lazyPackage(types.ModuleType):
+    def __init__(self, package):
+        """
+        Stands in for this package and imports the module behind a class the first time it's used.
+        """
+        
+        types.ModuleType.__init__(self, package.__name__, package.__doc__)
+        self.__dict__.update(package.__dict__)
+        
+        # Keep the real package around or Python 2 clears out its globals.
+        self.__package = package
+    
+    def __getattribute__(self, name):
+        # Class names win over the submodules that share them.
+        try:
+            return lazyLoaded[name]
+        
+        except KeyError:
+            None
+        
+        modName = lazyExports.get(name)
+        
+        if modName is None:
+            return types.ModuleType.__getattribute__(self, name)
+        
+        module = importlib.import_module("%s.%s" %(types.ModuleType.__getattribute__(self, '__name__'), modName))
+        lazyLoaded[name] = getattr(module, name)
+        
+        return lazyLoaded[name]
+    
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(lazyExports))
+
+__all__ = sorted(lazyExports)
+
+sys.modules[__name__] = adm300lazyPackage(sys.modules[__name__])
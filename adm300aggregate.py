@@ -0,0 +1,232 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+import threading
+import time
+
+class adm300aggregator:
+    def __init__(self, resolutions=(60, 3600), maxGap=30.0):
+        """
+        Streaming time-bucketed summaries of ADM-300 readings. Keeps one open bucket per resolution, in seconds, with the count, min, max, and mean of doseRt and doseRtUnf, how much dose accumulated, and how many seconds each alarm was active. Buckets line up with multiples of their resolution and are handed to the callback when a reading lands in a later one. Alarm time isn't counted across gaps in readings longer than maxGap seconds. Pass add() to adm300comm.setCallback() to summarize everything the meter sends.
+        """
+        
+        # Sanity check resolutions.
+        for resolution in resolutions:
+            if resolution <= 0:
+                raise ValueError("adm300aggregator: Resolution %s must be positive." %(resolution))
+        
+        self.__resolutions = tuple(resolutions)
+        self.__maxGap = maxGap
+        
+        # Fields we keep statistics for.
+        self.__statFields = ('doseRt', 'doseRtUnf')
+        
+        # Open bucket by resolution.
+        self.__open = dict((resolution, None) for resolution in self.__resolutions)
+        
+        # The last reading's timestamp, alarm flags, and accumulated dose.
+        self.__prevTime = None
+        self.__prevAlarms = None
+        self.__prevAcc = None
+        
+        # Closed bucket callback.
+        self.__bucketCb = self.__dummy
+        
+        # Readings come from the serial thread, flushes may not.
+        self.__lock = threading.Lock()
+    
+    @property
+    def resolutions(self):
+        """
+        Bucket sizes we keep, in seconds.
+        """
+        
+        return self.__resolutions
+    
+    def __dummy(self, bucket):
+        """
+        Dummy callback.
+        """
+        
+        return
+    
+    def setCallback(self, cb):
+        """
+        Set a callback function for closed buckets. It must accept one argument: a dictionary with the resolution, start and end times, count, min, max, and mean of doseRt and doseRtUnf, doseAccDelta, and rateAlarmSeconds, doseAlarmSeconds, and battAlarmSeconds.
+        """
+        
+        # Set the reference.
+        self.__bucketCb = cb
+    
+    def __newBucket(self, resolution, start):
+        """
+        Start an empty bucket.
+        """
+        
+        bucket = {
+            'resolution': resolution,
+            'start': start,
+            'end': start + resolution,
+            'count': 0,
+            'doseAccDelta': 0.0,
+            'rateAlarmSeconds': 0.0,
+            'doseAlarmSeconds': 0.0,
+            'battAlarmSeconds': 0.0
+        }
+        
+        for field in self.__statFields:
+            bucket[field + 'Min'] = None
+            bucket[field + 'Max'] = None
+            bucket[field + 'Sum'] = 0.0
+        
+        return bucket
+    
+    def __finish(self, bucket):
+        """
+        Finish a bucket off so it can be handed to the callback.
+        """
+        
+        for field in self.__statFields:
+            total = bucket.pop(field + 'Sum')
+            
+            if bucket['count']:
+                bucket[field + 'Mean'] = total / bucket['count']
+            else:
+                bucket[field + 'Mean'] = None
+        
+        return bucket
+    
+    def __emit(self, buckets):
+        """
+        Hand closed buckets to the callback.
+        """
+        
+        for bucket in buckets:
+            try:
+                self.__bucketCb(bucket)
+            
+            except:
+                # Exceptions should be handled in callback methods.
+                None
+    
+    def __addAlarmTime(self, bucket, start, end):
+        """
+        Credit the alarms from the last reading with the time between start and end.
+        """
+        
+        if (self.__prevTime is None) or (end <= start):
+            return
+        
+        rateAlarm, doseAlarm, battAlarm = self.__prevAlarms
+        
+        if rateAlarm:
+            bucket['rateAlarmSeconds'] += end - start
+        
+        if doseAlarm:
+            bucket['doseAlarmSeconds'] += end - start
+        
+        if battAlarm:
+            bucket['battAlarmSeconds'] += end - start
+    
+    def add(self, reading, timestamp=None):
+        """
+        Add a parsed reading. Invalid readings are ignored. Timestamps earlier than the last reading are moved up to it.
+        """
+        
+        if not reading['valid']:
+            return
+        
+        if timestamp is None:
+            timestamp = time.time()
+        
+        closed = []
+        
+        with self.__lock:
+            prevTime = self.__prevTime
+            
+            if (prevTime is not None) and (timestamp < prevTime):
+                timestamp = prevTime
+            
+            # Only count alarm time between readings that are close enough together.
+            gapOk = (prevTime is not None) and ((timestamp - prevTime) <= self.__maxGap)
+            
+            # How much dose accumulated since the last reading. A drop means it was cleared and started over from 0.
+            doseAcc = reading['doseAcc']
+            
+            if self.__prevAcc is None:
+                accDelta = 0.0
+            elif doseAcc >= self.__prevAcc:
+                accDelta = doseAcc - self.__prevAcc
+            else:
+                accDelta = doseAcc
+            
+            for resolution in self.__resolutions:
+                bucket = self.__open[resolution]
+                start = math.floor(timestamp / resolution) * resolution
+                
+                if (bucket is not None) and (bucket['start'] != start):
+                    # The rest of the old bucket belongs to it.
+                    if gapOk:
+                        self.__addAlarmTime(bucket, prevTime, bucket['end'])
+                    
+                    closed.append(self.__finish(bucket))
+                    bucket = None
+                
+                if bucket is None:
+                    bucket = self.__newBucket(resolution, start)
+                    self.__open[resolution] = bucket
+                
+                if gapOk:
+                    self.__addAlarmTime(bucket, max(prevTime, start), timestamp)
+                
+                bucket['count'] += 1
+                bucket['doseAccDelta'] += accDelta
+                
+                for field in self.__statFields:
+                    val = reading[field]
+                    bucket[field + 'Sum'] += val
+                    
+                    if (bucket[field + 'Min'] is None) or (val < bucket[field + 'Min']):
+                        bucket[field + 'Min'] = val
+                    
+                    if (bucket[field + 'Max'] is None) or (val > bucket[field + 'Max']):
+                        bucket[field + 'Max'] = val
+            
+            self.__prevTime = timestamp
+            self.__prevAlarms = (reading['rateAlarm'], reading['doseAlarm'], reading['battAlarm'])
+            self.__prevAcc = doseAcc
+        
+        # Don't hold the lock while the callback runs.
+        self.__emit(closed)
+    
+    def flush(self):
+        """
+        Close every open bucket early, such as when shutting down.
+        """
+        
+        closed = []
+        
+        with self.__lock:
+            for resolution in self.__resolutions:
+                bucket = self.__open[resolution]
+                
+                if bucket is not None:
+                    closed.append(self.__finish(bucket))
+                    self.__open[resolution] = None
+        
+        self.__emit(closed)
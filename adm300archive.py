@@ -0,0 +1,289 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import array
+import mmap
+import os
+import struct
+import time
+
+# File header: magic, version, record size.
+archiveMagic = "ADM300AR"
+archiveVersion = 1
+archiveHeader = struct.Struct("<8sHH4x")
+
+# Records: timestamp, doseRt, doseAcc, doseRtUnf, seqNo, flag bits, probe code, checksum.
+archiveRecord = struct.Struct("<ddddBBBB")
+
+# Flag bits.
+flagRateAlarm = 0x01
+flagDoseAlarm = 0x02
+flagBattAlarm = 0x04
+
+# Probe codes.
+probeCodes = {
+    "Unknown": 0,
+    "Internal low range": 1,
+    "Internal high range": 2
+}
+probeNames = dict((code, name) for name, code in probeCodes.items())
+
+def packReading(reading, timestamp):
+    """
+    Pack a parsed reading into a fixed-size record.
+    """
+    
+    flags = 0
+    
+    if reading['rateAlarm']:
+        flags |= flagRateAlarm
+    
+    if reading['doseAlarm']:
+        flags |= flagDoseAlarm
+    
+    if reading['battAlarm']:
+        flags |= flagBattAlarm
+    
+    return archiveRecord.pack(
+        timestamp,
+        reading['doseRt'],
+        reading['doseAcc'],
+        reading['doseRtUnf'],
+        reading['seqNo'],
+        flags,
+        probeCodes.get(reading['probe'], 0),
+        reading['checksum']
+    )
+
+def unpackRecord(data, offset=0):
+    """
+    Unpack a fixed-size record into a dictionary like a parsed reading plus its timestamp.
+    """
+    
+    timestamp, doseRt, doseAcc, doseRtUnf, seqNo, flags, probe, checksum = archiveRecord.unpack_from(data, offset)
+    
+    return {
+        'timestamp': timestamp,
+        'seqNo': seqNo,
+        'doseRt': doseRt,
+        'doseAcc': doseAcc,
+        'doseRtUnf': doseRtUnf,
+        'rateAlarm': bool(flags & flagRateAlarm),
+        'doseAlarm': bool(flags & flagDoseAlarm),
+        'battAlarm': bool(flags & flagBattAlarm),
+        'probe': probeNames.get(probe, "Unknown"),
+        'checksum': checksum,
+        'valid': True
+    }
+
+
+class adm300archiveWriter:
+    def __init__(self, path):
+        """
+        Append-only binary archive of ADM-300 readings. Pass add() to adm300comm.setCallback() to archive everything the meter sends.
+        """
+        
+        self.__dName = "adm300archiveWriter"
+        self.__lastTime = None
+        
+        # Open for update so a torn record left by a crash can be cut off before we append.
+        if os.path.exists(path):
+            self.__file = open(path, 'r+b')
+        else:
+            self.__file = open(path, 'w+b')
+        
+        size = os.fstat(self.__file.fileno()).st_size
+        
+        # New file? Write the header.
+        if size == 0:
+            self.__file.write(archiveHeader.pack(archiveMagic, archiveVersion, archiveRecord.size))
+            self.__file.flush()
+        
+        else:
+            if size < archiveHeader.size:
+                self.__file.close()
+                raise ValueError("%s: %s is truncated." %(self.__dName, path))
+            
+            magic, version, recSize = archiveHeader.unpack(self.__file.read(archiveHeader.size))
+            
+            if (magic != archiveMagic) or (version != archiveVersion) or (recSize != archiveRecord.size):
+                self.__file.close()
+                raise ValueError("%s: %s is not a version %s archive." %(self.__dName, path, archiveVersion))
+            
+            count = (size - archiveHeader.size) // archiveRecord.size
+            end = archiveHeader.size + (count * archiveRecord.size)
+            
+            # Drop a partially written record at the end so new records stay aligned.
+            if end < size:
+                self.__file.truncate(end)
+            
+            # Pick up where the last record left off so timestamps stay in order.
+            if count > 0:
+                self.__file.seek(end - archiveRecord.size)
+                self.__lastTime = unpackRecord(self.__file.read(archiveRecord.size))['timestamp']
+            
+            self.__file.seek(end)
+    
+    def add(self, reading, timestamp=None):
+        """
+        Add a parsed reading. Invalid readings are ignored. Timestamps earlier than the last record are moved up to it so the archive stays sorted.
+        """
+        
+        if not reading['valid']:
+            return
+        
+        if timestamp is None:
+            timestamp = time.time()
+        
+        if (self.__lastTime is not None) and (timestamp < self.__lastTime):
+            timestamp = self.__lastTime
+        
+        self.__lastTime = timestamp
+        self.__file.write(packReading(reading, timestamp))
+    
+    def flush(self):
+        """
+        Flush records to disk.
+        """
+        
+        self.__file.flush()
+    
+    def close(self):
+        """
+        Flush and close the archive.
+        """
+        
+        self.__file.close()
+
+
+class adm300archiveReader:
+    def __init__(self, path, indexStride=1024):
+        """
+        Memory-mapped reader for archives written by adm300archiveWriter. Keeps a sparse index of every indexStride-th timestamp to find time ranges with a binary search.
+        """
+        
+        self.__dName = "adm300archiveReader"
+        self.__stride = indexStride
+        
+        self.__file = open(path, 'rb')
+        self.__map = None
+        self.__count = 0
+        
+        # Timestamps of every stride-th record.
+        self.__index = array.array('d')
+        
+        self.refresh()
+        
+        magic, version, recSize = archiveHeader.unpack_from(self.__map, 0)
+        
+        if (magic != archiveMagic) or (version != archiveVersion) or (recSize != archiveRecord.size):
+            raise ValueError("%s: %s is not a version %s archive." %(self.__dName, path, archiveVersion))
+    
+    def refresh(self):
+        """
+        Pick up records appended since we opened the archive.
+        """
+        
+        size = os.fstat(self.__file.fileno()).st_size
+        
+        if size < archiveHeader.size:
+            raise ValueError("%s: Archive is truncated." %(self.__dName))
+        
+        if self.__map is not None:
+            self.__map.close()
+        
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        # Ignore a partially written record at the end.
+        self.__count = (size - archiveHeader.size) // archiveRecord.size
+        
+        # Extend the sparse index.
+        for num in range(len(self.__index) * self.__stride, self.__count, self.__stride):
+            self.__index.append(self.__timestamp(num))
+    
+    def close(self):
+        """
+        Close the archive.
+        """
+        
+        self.__map.close()
+        self.__file.close()
+    
+    def __len__(self):
+        return self.__count
+    
+    def __timestamp(self, num):
+        """
+        Get just the timestamp of a record.
+        """
+        
+        return struct.unpack_from("<d", self.__map, archiveHeader.size + (num * archiveRecord.size))[0]
+    
+    def __getitem__(self, num):
+        """
+        Get a record as a dictionary.
+        """
+        
+        if num < 0:
+            num += self.__count
+        
+        if (num < 0) or (num >= self.__count):
+            raise IndexError("%s: Record out of range." %(self.__dName))
+        
+        return unpackRecord(self.__map, archiveHeader.size + (num * archiveRecord.size))
+    
+    def findTime(self, timestamp):
+        """
+        Get the number of the first record at or after timestamp.
+        """
+        
+        # Find the block using the sparse index...
+        lo = 0
+        hi = len(self.__index)
+        
+        while lo < hi:
+            mid = (lo + hi) // 2
+            
+            if self.__index[mid] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        
+        # ... then search inside the block before it.
+        hi = min(lo * self.__stride, self.__count)
+        lo = max(0, (lo - 1) * self.__stride)
+        
+        while lo < hi:
+            mid = (lo + hi) // 2
+            
+            if self.__timestamp(mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        
+        return lo
+    
+    def between(self, start, end):
+        """
+        Generator that yields records with timestamps from start up to but not including end.
+        """
+        
+        num = self.findTime(start)
+        
+        while (num < self.__count) and (self.__timestamp(num) < end):
+            yield self[num]
+            num += 1
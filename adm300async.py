@@ -0,0 +1,350 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+Requires Python 3.7 or newer for asyncio.get_running_loop().
+"""
+
+import asyncio
+import collections
+import errno
+import os
+import adm300common
+import adm300framer
+import adm300parse
+
+class adm300async(asyncio.Protocol):
+    def __init__(self, maxQueue=0, debug=False):
+        """
+        asyncio Canberra/NRC ADM-300 communication class. Can be used as an asyncio protocol with any transport, opened directly on a serial port or pty with open(), or fed data with feed(). Parsed sentences are available by iterating over the object with async for. Set maxQueue to limit how many unread sentences are kept.
+        """
+        
+        # Set class-wide properties.
+        self.__debug = debug
+        self.__dName = "adm300async"
+        
+        # How much we read at once.
+        self.__readSize = 4096
+        
+        # Status flags
+        self.__gotPO = False
+        self.__gotSentence = False
+        self.__closed = False
+        
+        # Hold last reports from ADM-300.
+        self.__lastReport = {'valid': False}
+        self.__lastRawReport = ""
+        
+        # Unread sentences, and futures waiting on the next ones in the order they asked.
+        self.__readings = collections.deque(maxlen=(maxQueue or None))
+        self.__waiters = collections.deque()
+        
+        # Set when we see the power on char. Made by waitPowerOn() so it belongs to the running loop.
+        self.__poEvent = None
+        
+        # Where our data goes and comes from.
+        self.__transport = None
+        self.__ser = None
+        self.__fd = None
+        self.__loop = None
+        self.__txBuf = b""
+        
+        # Sentence parser and framer.
+        self.__ap = adm300parse.adm300parse(debug=debug)
+        self.__framer = adm300framer.adm300framer()
+    
+    @property
+    def gotPowerOn(self):
+        """
+        Did we get a power on character?
+        """
+        
+        return self.__gotPO
+    
+    @property
+    def gotSentence(self):
+        """
+        Did we get a sentence?
+        """
+        
+        return self.__gotSentence
+    
+    @property
+    def lastReport(self):
+        """
+        Returns the last parsed report we got from the ADM-300.
+        """
+        
+        return self.__lastReport
+    
+    @property
+    def lastRawReport(self):
+        """
+        Returns the last raw report we got from the ADM-300.
+        """
+        
+        return self.__lastRawReport
+    
+    async def waitPowerOn(self):
+        """
+        Wait until the ADM-300 powers on.
+        """
+        
+        if self.__gotPO:
+            return
+        
+        if self.__poEvent is None:
+            self.__poEvent = asyncio.Event()
+        
+        await self.__poEvent.wait()
+    
+    def __aiter__(self):
+        return self
+    
+    def __anext__(self):
+        """
+        Returns an awaitable for the next parsed sentence.
+        """
+        
+        fut = asyncio.get_running_loop().create_future()
+        
+        if self.__readings:
+            fut.set_result(self.__readings.popleft())
+        
+        elif self.__closed:
+            fut.set_exception(StopAsyncIteration())
+        
+        else:
+            self.__waiters.append(fut)
+        
+        return fut
+    
+    def __deliver(self, pLine):
+        """
+        Hand a parsed sentence to whoever is waiting, or queue it.
+        """
+        
+        # Skip anyone who gave up waiting.
+        while self.__waiters:
+            fut = self.__waiters.popleft()
+            
+            if not fut.done():
+                fut.set_result(pLine)
+                return
+        
+        self.__readings.append(pLine)
+    
+    def feed(self, data):
+        """
+        Feed raw data from the ADM-300 in. Accepts bytes or strings.
+        """
+        
+        frames = self.__framer.feed(data)
+        
+        for frame in frames:
+            if frame == self.__ap.powerOnChar:
+                self.__gotPO = True
+                
+                if self.__poEvent is not None:
+                    self.__poEvent.set()
+                
+                continue
+            
+            self.__lastRawReport = frame
+            
+            try:
+                pLine = self.__ap.parseSentence(frame)
+            
+            except ValueError:
+                # Garbage that happens to end in the right char.
+                continue
+            
+            self.__lastReport = pLine
+            self.__gotSentence = True
+            self.__deliver(pLine)
+    
+    def connection_made(self, transport):
+        """
+        asyncio protocol hook for a new transport.
+        """
+        
+        self.__transport = transport
+    
+    def data_received(self, data):
+        """
+        asyncio protocol hook for incoming data.
+        """
+        
+        self.feed(data)
+    
+    def connection_lost(self, exc):
+        """
+        asyncio protocol hook for the transport going away.
+        """
+        
+        self.__transport = None
+        self.close()
+    
+    def open(self, dev="/dev/ttyUSB0", baud=300):
+        """
+        Open a serial port or pty and start reading from it on the running event loop.
+        """
+        
+        import serial
+        
+        if self.__debug: print("%s: Init serial port %s." %(self.__dName, dev))
+        
+        # Non-blocking serial port.
+        self.__ser = serial.Serial(dev, baud, timeout=0)
+        self.__fd = self.__ser.fileno()
+        
+        self.__loop = asyncio.get_running_loop()
+        self.__loop.add_reader(self.__fd, self.__readFd)
+    
+    def __readFd(self):
+        """
+        Read whatever is waiting on our file descriptor.
+        """
+        
+        try:
+            data = os.read(self.__fd, self.__readSize)
+        
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            
+            if e.errno != errno.EIO:
+                raise
+            
+            data = b""
+        
+        # The port went away.
+        if not data:
+            self.close()
+            return
+        
+        self.feed(data)
+    
+    def __writeFd(self):
+        """
+        Send as much pending data as the port will take.
+        """
+        
+        try:
+            sent = os.write(self.__fd, self.__txBuf)
+        
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            
+            raise
+        
+        self.__txBuf = self.__txBuf[sent:]
+        
+        if not self.__txBuf:
+            self.__loop.remove_writer(self.__fd)
+    
+    def close(self):
+        """
+        Stop talking to the ADM-300 and end iteration once queued sentences are read.
+        """
+        
+        if self.__closed:
+            return
+        
+        self.__closed = True
+        
+        if self.__fd is not None:
+            self.__loop.remove_reader(self.__fd)
+            self.__loop.remove_writer(self.__fd)
+            self.__ser.close()
+            self.__fd = None
+        
+        if self.__transport is not None:
+            self.__transport.close()
+        
+        # Wake everyone still waiting for a sentence.
+        while self.__waiters:
+            fut = self.__waiters.popleft()
+            
+            if not fut.done():
+                fut.set_exception(StopAsyncIteration())
+    
+    def __sendCmd(self, cmdStr):
+        """
+        Send the command to the ADM-300.
+        """
+        
+        # Build the command string.
+        sendCmd = adm300common.buildCmd(cmdStr).encode('latin-1')
+        
+        # Debug
+        if self.__debug: print("%s: Sending %r..." %(self.__dName, sendCmd))
+        
+        if self.__transport is not None:
+            self.__transport.write(sendCmd)
+        
+        elif self.__fd is not None:
+            # Let the event loop write it when the port is ready.
+            if not self.__txBuf:
+                self.__loop.add_writer(self.__fd, self.__writeFd)
+            
+            self.__txBuf += sendCmd
+        
+        else:
+            raise IOError("%s: Not connected." %(self.__dName))
+    
+    def __tryCmd(self, cmdStr):
+        """
+        Send a command, returning whether it worked.
+        """
+        
+        worked = True
+        
+        try:
+            self.__sendCmd(cmdStr)
+        
+        except:
+            worked = False
+        
+        return worked
+    
+    def startReports(self):
+        """
+        Start acquiring readings from the ADM-300.
+        """
+        
+        return self.__tryCmd(adm300common.cmdStartMon)
+    
+    def stopReports(self):
+        """
+        Stop acquiring readings from the ADM-300.
+        """
+        
+        return self.__tryCmd(adm300common.cmdStopMon)
+    
+    def clearDose(self):
+        """
+        Clear accumulated dose on the ADM-300.
+        """
+        
+        return self.__tryCmd(adm300common.cmdClearDose)
+    
+    def clearAlarm(self):
+        """
+        Clear active alarms on the ADM-300.
+        """
+        
+        return self.__tryCmd(adm300common.cmdAlarmAck)
@@ -0,0 +1,256 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import mmap
+import multiprocessing
+import os
+import adm300framer
+import adm300parse
+
+# CSV columns, in the order parseBatch names them.
+csvColumns = ['seqNo', 'doseRt', 'doseAcc', 'doseRtUnf', 'rateAlarm', 'doseAlarm', 'battAlarm', 'probe', 'checksum']
+
+# One parser per worker process.
+parserCache = {}
+
+def chunkParser(checksum):
+    """
+    Get this process's parser.
+    """
+    
+    if checksum not in parserCache:
+        parserCache[checksum] = adm300parse.adm300parse(checksum=checksum)
+    
+    return parserCache[checksum]
+
+def readChunk(path, start, end):
+    """
+    Read part of a capture file and cut it into candidate sentences.
+    """
+    
+    with open(path, 'rb') as capture:
+        capture.seek(start)
+        data = capture.read(end - start)
+    
+    if not isinstance(data, str):
+        data = data.decode('latin-1')
+    
+    # Sentences never contain a sentence end, so the chars before each one are the rest of the candidate. The piece after the last one is a partial sentence.
+    bodyLen = adm300framer.sentenceLen - 1
+    
+    return [piece[-bodyLen:] + "]" for piece in data.split("]")[:-1] if len(piece) >= bodyLen]
+
+def emptyStats():
+    """
+    Statistics for nothing.
+    """
+    
+    return {
+        'sentences': 0,
+        'valid': 0,
+        'invalid': 0,
+        'doseRtMin': None,
+        'doseRtMax': None,
+        'doseRtSum': 0.0,
+        'doseAccMax': None,
+        'rateAlarms': 0,
+        'doseAlarms': 0,
+        'battAlarms': 0,
+        'probes': {}
+    }
+
+def mergeStats(into, other):
+    """
+    Fold the statistics of a later chunk into those of earlier ones.
+    """
+    
+    for key in ('sentences', 'valid', 'invalid', 'doseRtSum', 'rateAlarms', 'doseAlarms', 'battAlarms'):
+        into[key] += other[key]
+    
+    for key, pick in (('doseRtMin', min), ('doseRtMax', max), ('doseAccMax', max)):
+        if other[key] is not None:
+            if into[key] is None:
+                into[key] = other[key]
+            else:
+                into[key] = pick(into[key], other[key])
+    
+    for probe, count in other['probes'].items():
+        into['probes'][probe] = into['probes'].get(probe, 0) + count
+    
+    return into
+
+def statsJob(job):
+    """
+    Parse a chunk and summarize it.
+    """
+    
+    path, start, end, checksum = job
+    cols = chunkParser(checksum).parseBatch(readChunk(path, start, end))
+    
+    retVal = emptyStats()
+    retVal['sentences'] = len(cols['valid'])
+    
+    # Only look at the valid readings.
+    valid = [i for i, isValid in enumerate(cols['valid']) if isValid]
+    
+    if valid:
+        doseRt = [cols['doseRt'][i] for i in valid]
+        
+        retVal['doseRtMin'] = min(doseRt)
+        retVal['doseRtMax'] = max(doseRt)
+        retVal['doseRtSum'] = sum(doseRt)
+        retVal['doseAccMax'] = max(cols['doseAcc'][i] for i in valid)
+        retVal['rateAlarms'] = sum(cols['rateAlarm'][i] for i in valid)
+        retVal['doseAlarms'] = sum(cols['doseAlarm'][i] for i in valid)
+        retVal['battAlarms'] = sum(cols['battAlarm'][i] for i in valid)
+        
+        for i in valid:
+            probe = chr(cols['probe'][i])
+            retVal['probes'][probe] = retVal['probes'].get(probe, 0) + 1
+    
+    retVal['valid'] = len(valid)
+    retVal['invalid'] = retVal['sentences'] - retVal['valid']
+    
+    return retVal
+
+def csvJob(job):
+    """
+    Parse a chunk into CSV rows of valid readings. Returns the row count and the rows.
+    """
+    
+    path, start, end, checksum = job
+    cols = chunkParser(checksum).parseBatch(readChunk(path, start, end))
+    
+    # Columns in CSV order, with the probe flag as a char.
+    colData = [cols[col] for col in csvColumns]
+    colData[csvColumns.index('probe')] = [chr(probe) for probe in cols['probe']]
+    
+    rows = []
+    
+    for isValid, row in zip(cols['valid'], zip(*colData)):
+        if isValid:
+            rows.append("%s,%r,%r,%r,%s,%s,%s,%s,%02X\n" %row)
+    
+    return (len(rows), "".join(rows))
+
+
+class adm300bulk:
+    def __init__(self, processes=None, chunkSize=4 * 1024 * 1024, checksum=True, debug=False):
+        """
+        Parses large raw ADM-300 captures on every core. Files are split into chunks of about chunkSize bytes that end on a sentence boundary, each chunk is parsed with parseBatch in a process pool, and results are merged back in file order. Processes defaults to the number of cores.
+        """
+        
+        # Set class-wide properties.
+        self.__processes = processes
+        self.__chunkSize = chunkSize
+        self.__checksum = checksum
+        self.__debug = debug
+        self.__dName = "adm300bulk"
+        
+        # Data sentence end.
+        self.__readingOver = adm300framer.readingOver
+    
+    def chunks(self, paths):
+        """
+        Split capture files into jobs of (path, start, end, checksum). Every chunk but the last in a file ends just after a sentence end so no sentence is split between chunks.
+        """
+        
+        jobs = []
+        
+        for path in paths:
+            size = os.path.getsize(path)
+            
+            if size == 0:
+                continue
+            
+            with open(path, 'rb') as capture:
+                capMap = mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ)
+                
+                try:
+                    start = 0
+                    
+                    while start < size:
+                        # Move the end up to the next sentence end.
+                        end = capMap.find(self.__readingOver, min(start + self.__chunkSize, size) - 1)
+                        
+                        if end < 0:
+                            end = size
+                        else:
+                            end += 1
+                        
+                        jobs.append((path, start, end, self.__checksum))
+                        start = end
+                
+                finally:
+                    capMap.close()
+        
+        if self.__debug: print("%s: Split %s files into %s chunks." %(self.__dName, len(paths), len(jobs)))
+        
+        return jobs
+    
+    def __run(self, fn, paths):
+        """
+        Generator that runs fn on each chunk in a process pool and yields results in file order.
+        """
+        
+        pool = multiprocessing.Pool(self.__processes)
+        
+        try:
+            for result in pool.imap(fn, self.chunks(paths)):
+                yield result
+            
+            pool.close()
+        
+        except:
+            pool.terminate()
+            raise
+        
+        finally:
+            pool.join()
+    
+    def stats(self, paths):
+        """
+        Returns aggregate statistics for the readings in the capture files: sentence counts, doseRt min, max, and mean, the largest doseAcc, how many readings had each alarm set, and readings per probe flag.
+        """
+        
+        retVal = emptyStats()
+        
+        for result in self.__run(statsJob, paths):
+            mergeStats(retVal, result)
+        
+        if retVal['valid']:
+            retVal['doseRtMean'] = retVal['doseRtSum'] / retVal['valid']
+        else:
+            retVal['doseRtMean'] = None
+        
+        return retVal
+    
+    def toCsv(self, paths, outPath):
+        """
+        Write every valid reading in the capture files to a CSV file in file order. Returns the number of rows written.
+        """
+        
+        rowCount = 0
+        
+        with open(outPath, 'w') as outFile:
+            outFile.write(",".join(csvColumns) + "\n")
+            
+            for count, rows in self.__run(csvJob, paths):
+                outFile.write(rows)
+                rowCount += count
+        
+        return rowCount
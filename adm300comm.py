@@ -15,16 +15,21 @@ You should have received a copy of the GNU General Public License
 along with pyadm300.  If not, see <http://www.gnu.org/licenses/>. 
 """
 
-import Queue
+import errno
+import select
 import serial
 import threading
 import time
+import adm300common
+import adm300framer
+import adm300history
 import adm300parse
+import adm300scheduler
 
 class adm300comm:
-    def __init__(self, dev="/dev/ttyUSB0", baud=300, timeout=0.1, debug=False):
+    def __init__(self, dev="/dev/ttyUSB0", baud=300, timeout=0.1, debug=False, compact=False, history=0, historyWindows=(60,), port=None, dispatch=None, stats=None, publishFilter=None, cmdTimeout=10.0, cmdGap=None):
         """
-        Canberra/NRC ADM-300 communication class.
+        Canberra/NRC ADM-300 communication class. If compact is set parsed sentences are adm300reading objects instead of dictionaries. If history is set we keep that many recent readings with rolling statistics over historyWindows. If port is set it is used instead of opening dev. It must act like a serial.Serial object, such as adm300replay. If dispatch is set to an adm300dispatch callbacks run on its workers instead of the serial thread. If stats is set to an adm300stats we keep counters and timings in it. If publishFilter is set to an adm300filter the parsed line callback only gets readings it passes, though lastReport and history still see every reading. Commands that aren't reflected in a sentence within cmdTimeout seconds of being written are reported as failed. Commands go out at least cmdGap seconds apart, by default the time the last one takes on the wire at baud, so ones queued in the meantime are sent most urgent first and duplicates are coalesced.
         """
         
         # Set class-wide device comm properties.
@@ -40,21 +45,31 @@ class adm300comm:
         # Status flags
         self.__gotPO = False
         self.__gotSentence = False
+        self.__gotValid = False
         
-        # Pre and post-command chars.
-        self.__cmdPrefix = "\r\n" # [0x0d, 0x0a]
-        self.__cmdTail = "}\r\n"
+        # Set once the ADM-300 powers on or sends a sentence.
+        self.__readyEvt = threading.Event()
         
-        # Command body
-        self.__cmdStartMon = "U"
-        self.__cmdStopMon = "X"
-        self.__cmdClearDose = "e"
-        self.__cmdAlarmAck = "g"
-        self.__cmdRateAlmSet = "11" # Send 11....###SE
-        self.__cmdDoseAlmSet = "22" # Send 22....###SE
+        # Set by anything from the ADM-300 that connect() should react to.
+        self.__streamEvt = threading.Event()
         
-        # Serial queue
-        self.__txQ = Queue.Queue() # Data _to_ the ADM-300
+        # Sentences parsed, so connect() can tell the ADM-300 is reporting.
+        self.__sentenceCount = 0
+        
+        # Serial thread, once it's started.
+        self.__serWk = None
+        
+        # Commands _to_ the ADM-300. Alarm acks go first and duplicate pending commands are coalesced.
+        self.__sched = adm300scheduler.adm300scheduler(cmdTimeout)
+        self.__prioAlarmAck = 0
+        self.__prioNormal = 1
+        
+        # Pending commands are held until the last one has had time to go out.
+        self.__cmdGap = cmdGap
+        self.__nextCmdTime = 0.0
+        
+        # Pipe used to wake the serial thread up when there's a command to send.
+        self.__waker = adm300common.adm300wakePipe()
         
         # This flag tells us if we should keep running.
         self.__keepRunning = True
@@ -63,20 +78,48 @@ class adm300comm:
         self.__lineCb = self.__dummy
         self.__rawCb = self.__dummy
         self.__pwrCb = self.__dummy
+        self.__cmdCb = self.__dummy
+        self.__alarmCb = self.__dummy
+        
+        # Alarm flags from the last sentence, before any were seen.
+        self.__lastAlarms = (False, False, False)
         
         # Hold last reports from ADM-300.
         self.__lastReport = {'valid': False}
         self.__lastRawReport = ""
         
+        # Where callbacks run.
+        self.__dispatch = dispatch
+        
+        # Hot path instrumentation.
+        self.__stats = stats
+        
+        # Decides which readings go to the parsed line callback.
+        self.__publishFilter = publishFilter
+        
+        # Recent reading history.
+        self.__history = None
+        
+        if history:
+            self.__history = adm300history.adm300history(history, historyWindows)
+        
         # Sentence parser
-        self.__ap = adm300parse.adm300parse(debug=debug)
+        self.__ap = adm300parse.adm300parse(debug=debug, compact=compact)
+        
+        # Frames up serial data, holding partial sentences between reads.
+        self.__framer = adm300framer.adm300framer()
         
         # Set up serial comm object.
         try:
-            if self.__debug: print("%s: Init serial port %s with timeout %s." %(self.__dName, self.__dev, self.__timeout))
+            if port is not None:
+                # Somebody gave us something that acts like a serial port.
+                self.__ser = port
             
-            # Set up serial port.
-            self.__ser = serial.Serial(self.__dev, self.__baud, timeout=self.__timeout)
+            else:
+                if self.__debug: print("%s: Init serial port %s with timeout %s." %(self.__dName, self.__dev, self.__timeout))
+                
+                # Set up serial port.
+                self.__ser = serial.Serial(self.__dev, self.__baud, timeout=self.__timeout)
         
         except:
             raise
@@ -114,6 +157,38 @@ class adm300comm:
         
         return self.__lastRawReport
     
+    @property
+    def stats(self):
+        """
+        Returns our adm300stats, or None if we aren't keeping statistics.
+        """
+        
+        return self.__stats
+    
+    @property
+    def scheduler(self):
+        """
+        Returns the adm300scheduler our commands go through.
+        """
+        
+        return self.__sched
+    
+    @property
+    def publishFilter(self):
+        """
+        Returns our adm300filter, or None if every reading is published.
+        """
+        
+        return self.__publishFilter
+    
+    @property
+    def history(self):
+        """
+        Returns the adm300history of recent readings, or None if we aren't keeping one.
+        """
+        
+        return self.__history
+    
     def __dummy(self, arg = ""):
         """
         Dummy callback.
@@ -121,85 +196,292 @@ class adm300comm:
         
         return
     
+    def __sendQueued(self):
+        """
+        Put the most urgent pending command on the serial port once the last one has had time to go out.
+        """
+        
+        now = time.time()
+        
+        if now < self.__nextCmdTime:
+            return
+        
+        # Do we have a command to send the ADM-300?
+        cmd = self.__sched.next()
+        
+        if cmd is None:
+            return
+        
+        # Debug?
+        if self.__debug: print("%s: Putting %s on serial port..." %(self.__dName, cmd['data']))
+        
+        # Send it!
+        self.__ser.write(cmd['data'])
+        
+        # Hold the next one until this one is on the wire.
+        gap = self.__cmdGap
+        
+        if gap is None:
+            gap = 0.0
+            
+            if self.__baud:
+                gap = len(cmd['data']) * 10.0 / self.__baud
+        
+        self.__nextCmdTime = now + gap
+        
+        if self.__stats is not None:
+            self.__stats.incr('commandsSent', kind=cmd['name'])
+        
+        self.__finishCmds(self.__sched.written(cmd))
+    
+    def __finishCmds(self, results):
+        """
+        Report commands the scheduler says are finished.
+        """
+        
+        for result in results:
+            if self.__debug: print("%s: Command %s %s." %(self.__dName, result['name'], "completed" if result['completed'] else "failed"))
+            
+            if self.__stats is not None:
+                self.__stats.observe('commandWriteSeconds', result['writeSeconds'], kind=result['name'])
+                
+                if result['completed']:
+                    self.__stats.incr('commandsCompleted', kind=result['name'])
+                    self.__stats.observe('commandConfirmSeconds', result['confirmSeconds'], kind=result['name'])
+                
+                else:
+                    self.__stats.incr('commandsFailed', kind=result['name'])
+            
+            self.__runCb('command', self.__cmdCb, result)
+    
+    def __runCb(self, kind, cb, *args):
+        """
+        Run a callback, or hand it to the dispatcher if we have one. Exceptions should be handled in callback methods, so we just count them.
+        """
+        
+        stats = self.__stats
+        
+        if self.__dispatch is not None:
+            if cb != self.__dummy:
+                self.__dispatch.dispatch(cb, *args)
+        
+        elif stats is None:
+            try:
+                cb(*args)
+            
+            except:
+                None
+        
+        else:
+            start = time.time()
+            
+            try:
+                cb(*args)
+            
+            except Exception as e:
+                stats.incr('callbackErrors', kind=e.__class__.__name__)
+            
+            stats.observe('callbackSeconds', time.time() - start, kind=kind)
+    
+    def __handleFrames(self, data):
+        """
+        Frame up data from the serial port and handle complete sentences and power on chars.
+        """
+        
+        stats = self.__stats
+        
+        if stats is not None:
+            readTime = time.time()
+            stats.incr('bytesRead', len(data))
+        
+        frames = self.__framer.feed(data)
+        
+        for frame in frames:
+            if frame == self.__admPO:
+                if stats is not None:
+                    stats.incr('powerOnEvents')
+                
+                # We have a power on character.
+                if self.__gotPO == False:
+                    # Set powered on flag.
+                    self.__gotPO = True
+                    self.__readyEvt.set()
+                    self.__streamEvt.set()
+                    
+                    # Trigger callback for power up.
+                    self.__runCb('power', self.__pwrCb)
+                
+                continue
+            
+            if stats is not None:
+                stats.incr('linesRead')
+            
+            # Check the alarm flags first so alarm changes go out before anything else.
+            if self.__alarmCb != self.__dummy:
+                self.__checkAlarms(frame)
+            
+            # Set the last raw report and trigger callback.
+            self.__lastRawReport = frame
+            self.__runCb('raw', self.__rawCb, frame)
+            
+            # Parse the data.
+            try:
+                if stats is None:
+                    pLine = self.__ap.parseSentence(frame)
+                
+                else:
+                    start = time.time()
+                    pLine = self.__ap.parseSentence(frame)
+                    stats.observe('parseSeconds', time.time() - start)
+            
+            except Exception as e:
+                # Don't kill the thread due to a parsing failure.
+                if stats is not None:
+                    stats.incr('parseFailures', kind=e.__class__.__name__)
+                
+                continue
+            
+            if stats is not None:
+                if pLine['valid']:
+                    stats.incr('parseSuccesses')
+                
+                else:
+                    stats.incr('parseFailures', kind='format')
+            
+            # Set the last report and see if it reflects any commands we sent.
+            self.__lastReport = pLine
+            
+            if pLine['valid']:
+                self.__finishCmds(self.__sched.observe(pLine))
+            
+            if self.__history is not None:
+                self.__history.add(pLine)
+            
+            if (self.__publishFilter is not None) and (not self.__publishFilter.check(pLine)):
+                if stats is not None:
+                    stats.incr('readingsSuppressed')
+            
+            else:
+                self.__runCb('line', self.__lineCb, pLine)
+                
+                if stats is not None:
+                    stats.observe('readToCallbackSeconds', time.time() - readTime)
+            
+            # Set the flag for getting a sentence.
+            self.__gotSentence = True
+            self.__sentenceCount += 1
+            
+            # The first good sentence means the ADM-300 is up and reporting.
+            if pLine['valid'] and (not self.__gotValid):
+                self.__gotValid = True
+                self.__readyEvt.set()
+                self.__streamEvt.set()
+    
+    def __checkAlarms(self, frame):
+        """
+        Pull just the flags out of a sentence and fire the alarm callback if any alarm changed.
+        """
+        
+        flags = self.__ap.classifyFlags(frame)
+        
+        if flags is None:
+            return
+        
+        rateAlarm, doseAlarm, battAlarm, probe = flags
+        
+        if (rateAlarm, doseAlarm, battAlarm) == self.__lastAlarms:
+            return
+        
+        self.__lastAlarms = (rateAlarm, doseAlarm, battAlarm)
+        
+        if self.__stats is not None:
+            self.__stats.incr('alarmTransitions')
+        
+        self.__runCb('alarm', self.__alarmCb, {'rateAlarm': rateAlarm, 'doseAlarm': doseAlarm, 'battAlarm': battAlarm, 'probeFlag': probe})
+    
     def __serThread(self):
         """
-        This thread communicates with the ADM-300.
+        This thread communicates with the ADM-300. It sleeps until either serial data arrives or a command is queued.
         """
         
         if self.__debug: print("%s: Start serial thread..." %(self.__dName))
         
-        try:
-            # As long as the thread is flagged to keep running...
-            while self.__keepRunning:
+        serFd = None
+        
+        # Windows serial ports can't be waited on with select.
+        if self.__waker.fd is not None:
+            serFd = self.__ser.fileno()
+        
+        # As long as the thread is flagged to keep running...
+        while self.__keepRunning:
+            if serFd is None:
+                # Send what we have then block on the serial port for up to the timeout.
+                self.__sendQueued()
+                self.__finishCmds(self.__sched.expire())
+                data = self.__ser.read(max(1, self.__ser.inWaiting()))
+            
+            else:
+                # Wake up in time to fail commands that never show up in a sentence, and to send the next pending command.
+                deadline = self.__sched.nextDeadline()
+                wakeAt = deadline
+                
+                if self.__sched.hasPending():
+                    wakeAt = self.__nextCmdTime if (wakeAt is None) else min(wakeAt, self.__nextCmdTime)
+                
+                if wakeAt is None:
+                    timeout = None
+                else:
+                    timeout = max(0.0, wakeAt - time.time())
+                
                 try:
-                    # Do we have a command to send the ADM-300?
-                    workItem = self.__txQ.get(False)
-                    
-                    # Debug?
-                    if self.__debug: print("%s: Putting %s on serial port..." %(self.__dName, workItem))
+                    readable = select.select([serFd, self.__waker.fd], [], [], timeout)[0]
+                
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
                     
-                    # Send it!
-                    self.__ser.write(workItem)
+                    raise
                 
-                except Queue.Empty:
-                    # Don't have data, don't care.
-                    None
+                # Were we woken up to send commands or shut down?
+                if self.__waker.fd in readable:
+                    self.__waker.drain()
                 
-                except:
-                    raise
+                self.__sendQueued()
                 
-                # Grab a line.
-                line = self.__ser.readline()
+                if serFd in readable:
+                    data = self.__ser.read(max(1, self.__ser.inWaiting()))
                 
-                # Line isn't blank or just a carriage return + line feed?
-                if (not line == "\r\n") and (not line == ''):
-                        # Did we get something that isn't a single char?
-                        if len(line) > 1:
-                            try:
-                                # Set the last raw report and trigger callback.
-                                self.__lastRawReport = line
-                                self.__rawCb(line)
-                                
-                                # Parse the data, set the last report, and trigger callback.
-                                pLine = self.__ap.parseSentence(line)
-                                self.__lastReport = pLine
-                                self.__lineCb(pLine)
-                                
-                                # Set the flag for getting a sentence.
-                                self.__gotSentence = True
-                            
-                            except:
-                                # Don't kill the thread due to a parsing failure.
-                                # Exceptions should be handled in callback methods.
-                                None
-                        else:    
-                            # We might have a power on character. Check for it.
-                            if (line == self.__admPO) and (self.__gotPO == False):
-                                # Set powered on flag.
-                                self.__gotPO = True
-                                
-                                # Trigger callback for power up.
-                                self.__pwrCb()
+                else:
+                    data = ""
                 
-                # Wait so we don't suck CPU up completely.
-                time.sleep(0.01)
-        except:
-            raise
+                if deadline is not None:
+                    self.__finishCmds(self.__sched.expire())
+            
+            if data:
+                self.__handleFrames(data)
     
-    def __sendCmd(self, cmdStr):
+    def __sendCmd(self, name, cmdStr, priority=None, confirm=None):
         """
-        Queue the command to be sent to the ADM-300.
+        Queue the command to be sent to the ADM-300. Confirm is called with each parsed sentence after the command goes out and returns True once one reflects it.
         """
         
+        if priority is None:
+            priority = self.__prioNormal
+        
         try:
             # Build the command string.
-            sendCmd = "%s%s%s" %(self.__cmdPrefix, cmdStr, self.__cmdTail)
+            sendCmd = adm300common.buildCmd(cmdStr)
             
             # Debug
             if self.__debug: print("%s: Putting %s on the queue..." %(self.__dName, sendCmd))
             
-            # Write the thing to the port.
-            self.__txQ.put(sendCmd, block=False)
+            # Queue it up. If the same command is already waiting it's coalesced.
+            if self.__sched.put(name, sendCmd, priority, confirm):
+                if self.__stats is not None:
+                    self.__stats.incr('commandsCoalesced', kind=name)
+            
+            # Make sure the serial thread sends it as soon as the port is free.
+            self.__waker.wake()
         
         except:
             raise
@@ -213,6 +495,9 @@ class adm300comm:
         
         # Set shutdown flag.
         self.__keepRunning = False
+        
+        # Make sure the serial thread sees it.
+        self.__waker.wake()
     
     def setPowerOnCallback(self, cb):
         """
@@ -230,6 +515,22 @@ class adm300comm:
         # Set the reference.
         self.__lineCb = cb
 
+    def setAlarmCallback(self, cb):
+        """
+        Set a callback function for alarm changes. It fires as soon as a sentence with different alarm flags arrives, before the sentence is fully parsed, and once for the first sentence with an alarm set. It must accept one argument: a dictionary with the rateAlarm, doseAlarm, and battAlarm flags and the raw probeFlag char.
+        """
+        
+        # Set the reference.
+        self.__alarmCb = cb
+    
+    def setCommandCallback(self, cb):
+        """
+        Set a callback function for commands finishing. It must accept one argument: a dictionary with the command name, whether it completed, how many duplicates were coalesced into it, and writeSeconds and confirmSeconds from when it was queued to when it was written and to when a sentence reflected it.
+        """
+        
+        # Set the reference.
+        self.__cmdCb = cb
+    
     def setRawCallback(self, cb):
         """
         Set a callback function for the raw, unparsed line of data. It must accept one argument: a string.
@@ -248,7 +549,69 @@ class adm300comm:
         self.__serWk.daemon = True
         self.__serWk.start()
     
+    
+    def waitReady(self, timeout=None):
+        """
+        Wait for the ADM-300 to power on or send a valid sentence. Returns whether it did.
+        """
+        
+        return self.__readyEvt.wait(timeout)
+    
+    
+    def connect(self, timeout=30.0, retry=2.0):
+        """
+        Start the serial thread if it isn't running and get readings flowing as soon as the ADM-300 takes the start command. The command goes out right away, again the moment the ADM-300 powers on, and again at the end of every retry period in which no sentence was parsed. The retry period is never shorter than two sentences on the wire at our baud rate, so we don't resend over a sentence that's still coming in. Returns whether we got a valid sentence within timeout seconds.
+        """
+        
+        if self.__serWk is None:
+            self.begin()
+        
+        # A sentence and its line ending take about 1.6 seconds at 300 baud.
+        if self.__baud:
+            retry = max(retry, 2 * (adm300framer.sentenceLen + 2) * 10.0 / self.__baud)
         
+        start = time.time()
+        deadline = start + timeout
+        
+        # When the current retry period started, how many sentences we'd parsed by then, and whether the ADM-300 had powered on.
+        periodStart = None
+        periodCount = self.__sentenceCount
+        periodPO = self.__gotPO
+        
+        while not self.__gotValid:
+            remaining = deadline - time.time()
+            
+            if remaining <= 0:
+                if self.__debug: print("%s: No sentences after %s sec." %(self.__dName, timeout))
+                
+                return False
+            
+            # Clear first so we can't miss a power on between checking and waiting.
+            self.__streamEvt.clear()
+            
+            if self.__gotValid:
+                break
+            
+            now = time.time()
+            poweredOn = self.__gotPO and (not periodPO)
+            
+            if (periodStart is None) or poweredOn or (now - periodStart >= retry):
+                # Resend unless sentences came in during the last period, or the ADM-300 just powered on and missed the command.
+                if (periodStart is None) or poweredOn or (self.__sentenceCount == periodCount):
+                    self.startReports()
+                
+                periodStart = now
+                periodCount = self.__sentenceCount
+                periodPO = self.__gotPO
+            
+            self.__streamEvt.wait(min(periodStart + retry - now, remaining))
+        
+        if self.__stats is not None:
+            self.__stats.observe('connectSeconds', time.time() - start)
+        
+        return True
+    
+    
     def startReports(self):
         """
         Start acquiring readings from the ADM-300.
@@ -257,7 +620,8 @@ class adm300comm:
         worked = True
         
         try:
-            self.__sendCmd(self.__cmdStartMon)
+            # Any sentence means we're getting readings.
+            self.__sendCmd('startReports', adm300common.cmdStartMon, confirm=lambda pLine: True)
         
         except:
             worked = False
@@ -273,7 +637,8 @@ class adm300comm:
         worked = True
         
         try:
-            self.__sendCmd(self.__cmdStopMon)
+            # Nothing to see once readings stop, so this is done when it's written.
+            self.__sendCmd('stopReports', adm300common.cmdStopMon)
         
         except:
             worked = False
@@ -289,7 +654,9 @@ class adm300comm:
         worked = True
         
         try:
-            self.__sendCmd(self.__cmdClearDose)
+            # Done once the accumulated dose drops.
+            before = self.__lastReport.get('doseAcc')
+            self.__sendCmd('clearDose', adm300common.cmdClearDose, confirm=lambda pLine: (not before) or (pLine['doseAcc'] < before))
         
         except:
             worked = False
@@ -305,7 +672,8 @@ class adm300comm:
         worked = True
         
         try:
-            self.__sendCmd(self.__cmdAlarmAck)
+            # Done once the alarms clear. This jumps ahead of other commands.
+            self.__sendCmd('clearAlarm', adm300common.cmdAlarmAck, self.__prioAlarmAck, lambda pLine: not (pLine['rateAlarm'] or pLine['doseAlarm']))
         
         except:
             worked = False
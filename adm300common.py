@@ -0,0 +1,114 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import errno
+import os
+
+try:
+    import fcntl
+
+except ImportError:
+    # Windows doesn't have fcntl, and can't select on serial ports anyway.
+    fcntl = None
+
+# Pre and post-command chars. The ADM-300 ends a command at cmdEnd.
+cmdPrefix = "\r\n" # [0x0d, 0x0a]
+cmdEnd = "}"
+cmdTail = cmdEnd + "\r\n"
+
+# Command bodies.
+cmdStartMon = "U"
+cmdStopMon = "X"
+cmdClearDose = "e"
+cmdAlarmAck = "g"
+cmdRateAlmSet = "11" # Send 11....###SE
+cmdDoseAlmSet = "22" # Send 22....###SE
+
+def buildCmd(cmdStr):
+    """
+    Wrap a command body in the chars the ADM-300 expects around it.
+    """
+    
+    return "%s%s%s" %(cmdPrefix, cmdStr, cmdTail)
+
+
+class adm300wakePipe:
+    def __init__(self):
+        """
+        Nonblocking pipe that wakes up a thread waiting in select() or poll(). Wait on fd for reads, call wake() from other threads, and drain() once woken. On Windows there's no pipe to wait on, so fd is None and wake() does nothing.
+        """
+        
+        self.__rd = None
+        self.__wr = None
+        
+        if fcntl is not None:
+            self.__rd, self.__wr = os.pipe()
+            
+            for fd in (self.__rd, self.__wr):
+                fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+    
+    @property
+    def fd(self):
+        """
+        File descriptor that becomes readable when we're woken up.
+        """
+        
+        return self.__rd
+    
+    def wake(self):
+        """
+        Wake the waiting thread up.
+        """
+        
+        if self.__wr is None:
+            return
+        
+        try:
+            os.write(self.__wr, b"w")
+        
+        except OSError as e:
+            # The pipe is full so the thread is already going to wake up.
+            if e.errno != errno.EAGAIN:
+                raise
+    
+    def drain(self):
+        """
+        Clear pending wakeups.
+        """
+        
+        if self.__rd is None:
+            return
+        
+        try:
+            os.read(self.__rd, 4096)
+        
+        except OSError as e:
+            # Somebody else already cleared them.
+            if e.errno != errno.EAGAIN:
+                raise
+    
+    def close(self):
+        """
+        Close the pipe.
+        """
+        
+        for fd in (self.__rd, self.__wr):
+            if fd is not None:
+                os.close(fd)
+        
+        self.__rd = None
+        self.__wr = None
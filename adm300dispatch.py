@@ -0,0 +1,198 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import Queue
+import threading
+
+class adm300dispatch:
+    def __init__(self, maxQueue=1000, policy="block", workers=1, debug=False):
+        """
+        Runs callbacks on worker threads fed by a bounded queue so slow consumers don't hold up serial reads. When the queue is full the policy decides what happens: "block" waits for room, "dropOldest" throws away the oldest queued call, and "dropNewest" throws away the new one. Callbacks run in order with one worker.
+        """
+        
+        if policy not in ("block", "dropOldest", "dropNewest"):
+            raise ValueError("adm300dispatch: Unknown overflow policy %s." %(policy))
+        
+        # Set class-wide properties.
+        self.__policy = policy
+        self.__debug = debug
+        self.__dName = "adm300dispatch"
+        
+        # Calls waiting for a worker.
+        self.__q = Queue.Queue(maxQueue)
+        
+        # Set by kill() so nothing gets queued behind the stop sentinels.
+        self.__stopping = False
+        
+        # Counters.
+        self.__lock = threading.Lock()
+        self.__queued = 0
+        self.__dropped = 0
+        self.__done = 0
+        self.__errors = 0
+        
+        # Workers that haven't been told to stop yet.
+        self.__running = workers
+        
+        # Spin up workers.
+        self.__workers = []
+        
+        for i in range(workers):
+            worker = threading.Thread(target=self.__workThread)
+            worker.daemon = True
+            worker.start()
+            self.__workers.append(worker)
+    
+    @property
+    def counters(self):
+        """
+        Returns a dictionary of how many calls were queued, dropped, run, and raised exceptions, and the current queue depth.
+        """
+        
+        with self.__lock:
+            return {
+                'queued': self.__queued,
+                'dropped': self.__dropped,
+                'done': self.__done,
+                'errors': self.__errors,
+                'depth': self.__q.qsize()
+            }
+    
+    def __workThread(self):
+        """
+        This thread runs queued callbacks.
+        """
+        
+        while True:
+            workItem = self.__q.get()
+            
+            # Told to stop? Pass the sentinel on so the next worker stops too.
+            if workItem is None:
+                with self.__lock:
+                    self.__running -= 1
+                    passOn = (self.__running > 0)
+                
+                if passOn:
+                    self.__q.put(None)
+                
+                break
+            
+            cb, args = workItem
+            
+            try:
+                cb(*args)
+            
+            except:
+                # Exceptions should be handled in callback methods.
+                with self.__lock:
+                    self.__errors += 1
+            
+            with self.__lock:
+                self.__done += 1
+    
+    def dispatch(self, cb, *args):
+        """
+        Queue cb to be called with args on a worker thread.
+        """
+        
+        workItem = (cb, args)
+        
+        # Don't queue anything behind the stop sentinels.
+        if self.__stopping:
+            with self.__lock:
+                self.__dropped += 1
+            
+            return
+        
+        if self.__policy == "block":
+            self.__q.put(workItem)
+        
+        else:
+            try:
+                self.__q.put(workItem, block=False)
+            
+            except Queue.Full:
+                with self.__lock:
+                    self.__dropped += 1
+                
+                if self.__policy == "dropNewest":
+                    return
+                
+                # Make room by throwing away the oldest call.
+                try:
+                    oldItem = self.__q.get(block=False)
+                
+                except Queue.Empty:
+                    oldItem = False
+                
+                # That was a stop sentinel, so put it back and drop this one instead.
+                if oldItem is None:
+                    try:
+                        self.__q.put(None, block=False)
+                    
+                    except Queue.Full:
+                        None
+                    
+                    return
+                
+                try:
+                    self.__q.put(workItem, block=False)
+                
+                except Queue.Full:
+                    # Lost a race with another producer. Drop this one instead.
+                    with self.__lock:
+                        self.__dropped += 1
+                    
+                    return
+        
+        with self.__lock:
+            self.__queued += 1
+    
+    def kill(self):
+        """
+        Stop the workers once they finish what's already queued. Never blocks. If the queue is full the oldest queued call is thrown away to make room for the stop sentinel, which each worker passes on to the next as it exits.
+        """
+        
+        self.__stopping = True
+        
+        while True:
+            try:
+                self.__q.put(None, block=False)
+                break
+            
+            except Queue.Full:
+                None
+            
+            # Make room by throwing away the oldest call.
+            try:
+                oldItem = self.__q.get(block=False)
+            
+            except Queue.Empty:
+                continue
+            
+            # We've already been killed, so the sentinel is on its way.
+            if oldItem is None:
+                try:
+                    self.__q.put(None, block=False)
+                
+                except Queue.Full:
+                    None
+                
+                return
+            
+            with self.__lock:
+                self.__dropped += 1
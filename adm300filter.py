@@ -0,0 +1,107 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+
+class adm300filter:
+    def __init__(self, rateDeadband=0.0, doseDeadband=0.0, heartbeat=60.0):
+        """
+        Change-only publishing filter for ADM-300 readings. A reading is published when doseRt or doseAcc moved more than their deadband from the last published reading, any alarm flag or the probe changed, or heartbeat seconds have passed since the last published reading. Deadbands are in the units the meter reports. Set heartbeat to 0 to turn it off. Invalid readings are always published.
+        """
+        
+        self.__rateDeadband = rateDeadband
+        self.__doseDeadband = doseDeadband
+        self.__heartbeat = heartbeat
+        
+        # The last reading we published and when.
+        self.__last = None
+        self.__lastTime = None
+        
+        # Counters.
+        self.__lock = threading.Lock()
+        self.__published = 0
+        self.__suppressed = 0
+        self.__heartbeats = 0
+    
+    @property
+    def counters(self):
+        """
+        Returns a dictionary of how many readings were published, how many were suppressed, and how many were published only because the heartbeat came due.
+        """
+        
+        with self.__lock:
+            return {
+                'published': self.__published,
+                'suppressed': self.__suppressed,
+                'heartbeats': self.__heartbeats
+            }
+    
+    def reset(self):
+        """
+        Forget the last published reading so the next one is always published.
+        """
+        
+        with self.__lock:
+            self.__last = None
+            self.__lastTime = None
+    
+    def check(self, reading, timestamp=None):
+        """
+        Returns whether the parsed reading should be published, and remembers it if so.
+        """
+        
+        if timestamp is None:
+            timestamp = time.time()
+        
+        with self.__lock:
+            last = self.__last
+            publish = True
+            heartbeat = False
+            
+            if reading['valid'] and (last is not None):
+                # Did anything we care about change?
+                changed = (
+                    (abs(reading['doseRt'] - last['doseRt']) > self.__rateDeadband) or
+                    (abs(reading['doseAcc'] - last['doseAcc']) > self.__doseDeadband) or
+                    (reading['rateAlarm'] != last['rateAlarm']) or
+                    (reading['doseAlarm'] != last['doseAlarm']) or
+                    (reading['battAlarm'] != last['battAlarm']) or
+                    (reading['probe'] != last['probe'])
+                )
+                
+                if not changed:
+                    if self.__heartbeat and ((timestamp - self.__lastTime) >= self.__heartbeat):
+                        heartbeat = True
+                    
+                    else:
+                        publish = False
+            
+            if publish:
+                self.__published += 1
+                
+                if heartbeat:
+                    self.__heartbeats += 1
+                
+                if reading['valid']:
+                    self.__last = reading
+                    self.__lastTime = timestamp
+            
+            else:
+                self.__suppressed += 1
+        
+        return publish
@@ -0,0 +1,152 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# ADM-300 data sentences are fixed-length and end with readingOver. The meter sends powerOn on its own when it powers up.
+sentenceLen = 47
+readingOver = b"]"
+powerOn = b"\x01"
+
+class adm300framer:
+    def __init__(self, sentenceLen=sentenceLen, readingOver=readingOver, powerOn=powerOn):
+        """
+        Incremental framer for raw ADM-300 serial data. Feed it chunks of any size from any byte source and it returns complete sentences and power on chars as they arrive, holding partial sentences until the rest shows up.
+        """
+        
+        self.__sentenceLen = sentenceLen
+        self.__readingOver = readingOver
+        self.__powerOn = powerOn
+        
+        # Power on frames are handed back the same way parsed ones are.
+        self.__powerOnFrame = self.__toStr(bytearray(powerOn))
+        
+        # Reused between reads. Everything in it has already been searched for a sentence end.
+        self.__buf = bytearray()
+        
+        # Counters.
+        self.__frameCount = 0
+        self.__dropped = 0
+    
+    @property
+    def powerOnFrame(self):
+        """
+        The frame returned for a power on char.
+        """
+        
+        return self.__powerOnFrame
+    
+    @property
+    def pending(self):
+        """
+        How many bytes of a partial sentence we're holding.
+        """
+        
+        return len(self.__buf)
+    
+    @property
+    def partial(self):
+        """
+        The partial sentence we're holding, as a native string.
+        """
+        
+        return self.__toStr(self.__buf)
+    
+    @property
+    def frameCount(self):
+        """
+        How many sentences we've framed.
+        """
+        
+        return self.__frameCount
+    
+    @property
+    def dropped(self):
+        """
+        How many junk bytes we've thrown away.
+        """
+        
+        return self.__dropped
+    
+    def __toStr(self, data):
+        """
+        Turn a slice of the buffer into a native string like the parser expects.
+        """
+        
+        if str is bytes:
+            return str(data)
+        
+        return data.decode('latin-1')
+    
+    def reset(self):
+        """
+        Throw away any partial sentence.
+        """
+        
+        del self.__buf[:]
+    
+    def feed(self, data):
+        """
+        Add a chunk of raw data. Returns a list of complete sentences and power on frames in the order they arrived. Accepts bytes or strings.
+        """
+        
+        if not isinstance(data, (bytes, bytearray)):
+            data = data.encode('latin-1')
+        
+        buf = self.__buf
+        readingOver = self.__readingOver
+        powerOn = self.__powerOn
+        sentenceLen = self.__sentenceLen
+        
+        # Only the new data can have a sentence end in it.
+        pos = 0
+        buf.extend(data)
+        end = buf.find(readingOver, max(0, len(buf) - len(data)))
+        
+        frames = []
+        
+        while end >= 0:
+            # Sentences are fixed-length, anything before them is junk.
+            start = max(pos, end - sentenceLen + 1)
+            
+            # Did the ADM-300 power on before this sentence?
+            if buf.find(powerOn, pos, start) >= 0:
+                frames.append(self.__powerOnFrame)
+            
+            self.__dropped += start - pos
+            
+            frames.append(self.__toStr(buf[start:end + 1]))
+            self.__frameCount += 1
+            
+            pos = end + 1
+            end = buf.find(readingOver, pos)
+        
+        # Power on chars arrive on their own, so don't sit on them.
+        poPos = buf.rfind(powerOn, pos)
+        
+        if poPos >= 0:
+            frames.append(self.__powerOnFrame)
+            self.__dropped += poPos - pos
+            pos = poPos + 1
+        
+        # Don't let junk without a sentence end pile up.
+        if len(buf) - pos >= sentenceLen:
+            self.__dropped += len(buf) - pos - (sentenceLen - 1)
+            pos = len(buf) - (sentenceLen - 1)
+        
+        # Shift what's left to the front. It's never more than one partial sentence.
+        del buf[:pos]
+        
+        return frames
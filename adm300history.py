@@ -0,0 +1,209 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import array
+import collections
+import math
+import threading
+import time
+
+class adm300history:
+    def __init__(self, capacity=3600, windows=(60,)):
+        """
+        Fixed-capacity history of ADM-300 readings. Keeps rolling mean, max, and min of doseRt and doseRtUnf over each window, given as a number of readings, and updates them in constant time per reading. Running sums are recomputed from the buffer once per window so floating point error can't build up.
+        """
+        
+        # Sanity check windows.
+        for window in windows:
+            if (window < 1) or (window > capacity):
+                raise ValueError("adm300history: Window %s must be between 1 and the capacity %s." %(window, capacity))
+        
+        self.__capacity = capacity
+        self.__windows = tuple(windows)
+        
+        # Fields we keep and the ones we have statistics for.
+        self.__fields = ('timestamp', 'seqNo', 'doseRt', 'doseAcc', 'doseRtUnf')
+        self.__statFields = ('doseRt', 'doseRtUnf')
+        
+        # Ring buffer columns.
+        self.__cols = {}
+        
+        for field in self.__fields:
+            self.__cols[field] = array.array('d', [0.0]) * capacity
+        
+        # Total readings ever added. The newest reading is at (__total - 1) % capacity.
+        self.__total = 0
+        
+        # Running sums and monotonic deques of (reading number, value) for max and min by window and field.
+        self.__sums = {}
+        self.__maxQ = {}
+        self.__minQ = {}
+        
+        for window in self.__windows:
+            for field in self.__statFields:
+                self.__sums[(window, field)] = 0.0
+                self.__maxQ[(window, field)] = collections.deque()
+                self.__minQ[(window, field)] = collections.deque()
+        
+        # Readers and the writer can be on different threads.
+        self.__lock = threading.Lock()
+    
+    @property
+    def capacity(self):
+        """
+        How many readings we can hold.
+        """
+        
+        return self.__capacity
+    
+    @property
+    def windows(self):
+        """
+        Windows we keep statistics for, in readings.
+        """
+        
+        return self.__windows
+    
+    def __len__(self):
+        return min(self.__total, self.__capacity)
+    
+    def __getitem__(self, idx):
+        """
+        Get a reading as a dictionary of the fields we keep. 0 is the oldest reading, -1 is the newest.
+        """
+        
+        with self.__lock:
+            count = min(self.__total, self.__capacity)
+            
+            if idx < 0:
+                idx += count
+            
+            if (idx < 0) or (idx >= count):
+                raise IndexError("adm300history: Index out of range.")
+            
+            pos = (self.__total - count + idx) % self.__capacity
+            
+            return dict((field, self.__cols[field][pos]) for field in self.__fields)
+    
+    def add(self, reading, timestamp=None):
+        """
+        Add a parsed reading. Invalid readings are ignored.
+        """
+        
+        if not reading['valid']:
+            return
+        
+        if timestamp is None:
+            timestamp = time.time()
+        
+        with self.__lock:
+            num = self.__total
+            pos = num % self.__capacity
+            
+            self.__cols['timestamp'][pos] = timestamp
+            self.__cols['seqNo'][pos] = reading['seqNo']
+            self.__cols['doseAcc'][pos] = reading['doseAcc']
+            
+            for field in self.__statFields:
+                val = reading[field]
+                
+                for window in self.__windows:
+                    key = (window, field)
+                    
+                    # Drop the value falling out of the window. It's still in the buffer since windows fit in it.
+                    if num >= window:
+                        self.__sums[key] -= self.__cols[field][(num - window) % self.__capacity]
+                    
+                    self.__sums[key] += val
+                    
+                    # Max: anything smaller than the new value can never be the max again.
+                    maxQ = self.__maxQ[key]
+                    
+                    while maxQ and (maxQ[-1][1] <= val):
+                        maxQ.pop()
+                    
+                    maxQ.append((num, val))
+                    
+                    if maxQ[0][0] <= num - window:
+                        maxQ.popleft()
+                    
+                    # Min: same idea.
+                    minQ = self.__minQ[key]
+                    
+                    while minQ and (minQ[-1][1] >= val):
+                        minQ.pop()
+                    
+                    minQ.append((num, val))
+                    
+                    if minQ[0][0] <= num - window:
+                        minQ.popleft()
+                
+                self.__cols[field][pos] = val
+            
+            self.__total += 1
+            
+            # Every window's worth of readings, throw away the rounding error the running sum has picked up. This costs one reading's worth of work per reading on average.
+            for window in self.__windows:
+                if (self.__total % window) == 0:
+                    for field in self.__statFields:
+                        self.__sums[(window, field)] = self.__windowSum(field, window)
+    
+    def __windowSum(self, field, window):
+        """
+        Exactly add up the newest window values of a field. Call with the lock held once the buffer holds at least window readings.
+        """
+        
+        col = self.__cols[field]
+        start = (self.__total - window) % self.__capacity
+        end = start + window
+        
+        if end <= self.__capacity:
+            return math.fsum(col[start:end])
+        
+        return math.fsum(col[start:]) + math.fsum(col[:end - self.__capacity])
+    
+    def stats(self, window=None):
+        """
+        Get rolling statistics for a window, or for every window if none is specified. Returns a dictionary with the count of readings and the mean, max, and min of each field.
+        """
+        
+        if window is None:
+            return dict((win, self.stats(win)) for win in self.__windows)
+        
+        if window not in self.__windows:
+            raise ValueError("adm300history: No statistics for window %s." %(window))
+        
+        retVal = {}
+        
+        with self.__lock:
+            count = min(self.__total, window)
+            retVal['count'] = count
+            
+            for field in self.__statFields:
+                key = (window, field)
+                
+                if count:
+                    retVal[field] = {
+                        'mean': self.__sums[key] / count,
+                        'max': self.__maxQ[key][0][1],
+                        'min': self.__minQ[key][0][1]
+                    }
+                
+                else:
+                    retVal[field] = {'mean': None, 'max': None, 'min': None}
+        
+        return retVal
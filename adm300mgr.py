@@ -0,0 +1,432 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import errno
+import os
+import select
+import serial
+import threading
+import adm300common
+import adm300framer
+import adm300parse
+
+class adm300mgr:
+    def __init__(self, debug=False):
+        """
+        Canberra/NRC ADM-300 multi-device manager class. Talks to many ADM-300s from a single thread using poll().
+        """
+        
+        # Set class-wide properties.
+        self.__debug = debug
+        self.__dName = "adm300mgr"
+        
+        # How much we read at once.
+        self.__readSize = 4096
+        
+        # Devices by name and by file descriptor.
+        self.__devs = {}
+        self.__fds = {}
+        
+        # Protects the device tables and transmit buffers.
+        self.__lock = threading.Lock()
+        
+        # This flag tells us if we should keep running.
+        self.__keepRunning = True
+        
+        # Sentence parser
+        self.__ap = adm300parse.adm300parse(debug=debug)
+        
+        # Poll object and a pipe used to wake it up.
+        self.__poller = select.poll()
+        self.__waker = adm300common.adm300wakePipe()
+        self.__poller.register(self.__waker.fd, select.POLLIN)
+    
+    def __dummy(self, arg = ""):
+        """
+        Dummy callback.
+        """
+        
+        return
+    
+    def __getDev(self, name):
+        """
+        Get a device by name.
+        """
+        
+        try:
+            dev = self.__devs[name]
+        
+        except KeyError:
+            raise ValueError("%s: No device named %s." %(self.__dName, name))
+        
+        return dev
+    
+    def __updatePoll(self, dev):
+        """
+        Set the poll events for a device based on whether it has data to send. Call with the lock held.
+        """
+        
+        # Closed ports stay out of the poll set.
+        if dev['closed']:
+            return
+        
+        events = select.POLLIN
+        
+        if dev['txBuf']:
+            events |= select.POLLOUT
+        
+        self.__poller.register(dev['fd'], events)
+    
+    def __closeDev(self, dev):
+        """
+        Stop polling a device whose port went away and close it. It stays in the device table so its last reports can still be read. Call with the lock held.
+        """
+        
+        if dev['closed']:
+            return
+        
+        dev['closed'] = True
+        dev['txBuf'] = ""
+        
+        self.__poller.unregister(dev['fd'])
+        del self.__fds[dev['fd']]
+        
+        try:
+            dev['ser'].close()
+        
+        except (OSError, serial.SerialException):
+            None
+    
+    def addDevice(self, name, dev="/dev/ttyUSB0", baud=300):
+        """
+        Add an ADM-300 attached to the given serial port under the given name.
+        """
+        
+        if self.__debug: print("%s: Init serial port %s for %s." %(self.__dName, dev, name))
+        
+        # Non-blocking serial port.
+        ser = serial.Serial(dev, baud, timeout=0)
+        
+        devInfo = {
+            'name': name,
+            'ser': ser,
+            'fd': ser.fileno(),
+            'framer': adm300framer.adm300framer(),
+            'txBuf': "",
+            'closed': False,
+            'gotPO': False,
+            'gotSentence': False,
+            'lastReport': {'valid': False},
+            'lastRawReport': "",
+            'lineCb': self.__dummy,
+            'rawCb': self.__dummy,
+            'pwrCb': self.__dummy
+        }
+        
+        with self.__lock:
+            if name in self.__devs:
+                ser.close()
+                raise ValueError("%s: Device %s already exists." %(self.__dName, name))
+            
+            self.__devs[name] = devInfo
+            self.__fds[devInfo['fd']] = devInfo
+            self.__updatePoll(devInfo)
+        
+        self.__waker.wake()
+    
+    def removeDevice(self, name):
+        """
+        Stop talking to the named ADM-300 and close its serial port.
+        """
+        
+        with self.__lock:
+            dev = self.__getDev(name)
+            
+            self.__closeDev(dev)
+            del self.__devs[name]
+        
+        self.__waker.wake()
+    
+    def isOpen(self, name):
+        """
+        Is the named device's serial port still open? Ports that go away are closed for us.
+        """
+        
+        return not self.__getDev(name)['closed']
+    
+    @property
+    def devices(self):
+        """
+        Names of the devices we're managing.
+        """
+        
+        return self.__devs.keys()
+    
+    def gotPowerOn(self, name):
+        """
+        Did we get a power on character from the named device?
+        """
+        
+        return self.__getDev(name)['gotPO']
+    
+    def gotSentence(self, name):
+        """
+        Did we get a sentence from the named device?
+        """
+        
+        return self.__getDev(name)['gotSentence']
+    
+    def lastReport(self, name):
+        """
+        Returns the last parsed report we got from the named ADM-300.
+        """
+        
+        return self.__getDev(name)['lastReport']
+    
+    def lastRawReport(self, name):
+        """
+        Returns the last raw report we got from the named ADM-300.
+        """
+        
+        return self.__getDev(name)['lastRawReport']
+    
+    def setPowerOnCallback(self, name, cb):
+        """
+        Set a callback function for the named device powering up.
+        """
+        
+        self.__getDev(name)['pwrCb'] = cb
+    
+    def setCallback(self, name, cb):
+        """
+        Set a callback function for parsed lines of data from the named device. It must accept one argument: a dictionary containg parsed ADM-300 data.
+        """
+        
+        self.__getDev(name)['lineCb'] = cb
+    
+    def setRawCallback(self, name, cb):
+        """
+        Set a callback function for raw, unparsed lines of data from the named device. It must accept one argument: a string.
+        """
+        
+        self.__getDev(name)['rawCb'] = cb
+    
+    def __handleRead(self, dev):
+        """
+        Read whatever the device has for us and handle any complete frames.
+        """
+        
+        try:
+            data = os.read(dev['fd'], self.__readSize)
+        
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            
+            if e.errno != errno.EIO:
+                raise
+            
+            data = ""
+        
+        # The port went away. Close it so we don't spin on it.
+        if not data:
+            if self.__debug: print("%s: Lost %s." %(self.__dName, dev['name']))
+            
+            with self.__lock:
+                self.__closeDev(dev)
+            
+            return
+        
+        frames = dev['framer'].feed(data)
+        
+        for frame in frames:
+            if frame == self.__ap.powerOnChar:
+                # Only fire the callback for the first one.
+                if not dev['gotPO']:
+                    dev['gotPO'] = True
+                    dev['pwrCb']()
+                
+                continue
+            
+            try:
+                # Set the last raw report and trigger callback.
+                dev['lastRawReport'] = frame
+                dev['rawCb'](frame)
+                
+                # Parse the data, set the last report, and trigger callback.
+                pLine = self.__ap.parseSentence(frame)
+                dev['lastReport'] = pLine
+                dev['lineCb'](pLine)
+                
+                # Set the flag for getting a sentence.
+                dev['gotSentence'] = True
+            
+            except:
+                # Don't kill the loop due to a parsing failure.
+                # Exceptions should be handled in callback methods.
+                None
+    
+    def __handleWrite(self, dev):
+        """
+        Send as much pending data to the device as it will take.
+        """
+        
+        with self.__lock:
+            try:
+                sent = os.write(dev['fd'], dev['txBuf'])
+            
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    return
+                
+                if e.errno not in (errno.EIO, errno.EPIPE):
+                    raise
+                
+                # The port went away.
+                if self.__debug: print("%s: Lost %s." %(self.__dName, dev['name']))
+                
+                self.__closeDev(dev)
+                return
+            
+            dev['txBuf'] = dev['txBuf'][sent:]
+            
+            # Stop asking to write once we're caught up.
+            if not dev['txBuf']:
+                self.__updatePoll(dev)
+    
+    def __pollThread(self):
+        """
+        This thread communicates with all of the ADM-300s.
+        """
+        
+        if self.__debug: print("%s: Start poll thread..." %(self.__dName))
+        
+        while self.__keepRunning:
+            # Sleep until something happens.
+            try:
+                events = self.__poller.poll()
+            
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                
+                raise
+            
+            for fd, event in events:
+                # Wakeups just make us take another look at the device table.
+                if fd == self.__waker.fd:
+                    self.__waker.drain()
+                    continue
+                
+                dev = self.__fds.get(fd)
+                
+                # Removed while we were waiting?
+                if dev is None:
+                    continue
+                
+                if event & select.POLLOUT:
+                    self.__handleWrite(dev)
+                
+                if (event & (select.POLLIN | select.POLLHUP | select.POLLERR)) and (not dev['closed']):
+                    self.__handleRead(dev)
+        
+        if self.__debug: print("%s: Poll thread exiting..." %(self.__dName))
+    
+    def __sendCmd(self, name, cmdStr):
+        """
+        Queue the command to be sent to the named ADM-300.
+        """
+        
+        # Build the command string.
+        sendCmd = adm300common.buildCmd(cmdStr)
+        
+        # Debug
+        if self.__debug: print("%s: Queueing %s for %s..." %(self.__dName, sendCmd, name))
+        
+        with self.__lock:
+            dev = self.__getDev(name)
+            
+            if dev['closed']:
+                raise IOError("%s: %s is closed." %(self.__dName, name))
+            
+            dev['txBuf'] += sendCmd
+            self.__updatePoll(dev)
+        
+        self.__waker.wake()
+    
+    def __tryCmd(self, name, cmdStr):
+        """
+        Send a command, returning whether it worked.
+        """
+        
+        worked = True
+        
+        try:
+            self.__sendCmd(name, cmdStr)
+        
+        except:
+            worked = False
+        
+        return worked
+    
+    def begin(self):
+        """
+        Spin up the poll thread.
+        """
+        
+        if self.__debug: print("%s: Calling poll thread..." %(self.__dName))
+        
+        self.__pollWk = threading.Thread(target=self.__pollThread)
+        self.__pollWk.daemon = True
+        self.__pollWk.start()
+    
+    def kill(self):
+        """
+        Flag the poll thread to stop running.
+        """
+        
+        # Set shutdown flag and make sure the thread sees it.
+        self.__keepRunning = False
+        self.__waker.wake()
+    
+    def startReports(self, name):
+        """
+        Start acquiring readings from the named ADM-300.
+        """
+        
+        return self.__tryCmd(name, adm300common.cmdStartMon)
+    
+    def stopReports(self, name):
+        """
+        Stop acquiring readings from the named ADM-300.
+        """
+        
+        return self.__tryCmd(name, adm300common.cmdStopMon)
+    
+    def clearDose(self, name):
+        """
+        Clear accumulated dose on the named ADM-300.
+        """
+        
+        return self.__tryCmd(name, adm300common.cmdClearDose)
+    
+    def clearAlarm(self, name):
+        """
+        Clear active alarms on the named ADM-300.
+        """
+        
+        return self.__tryCmd(name, adm300common.cmdAlarmAck)
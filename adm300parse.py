@@ -16,27 +16,229 @@ along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 
+import array
+import binascii
+import itertools
 import math
+import mmap
+import operator
+import struct
+import adm300framer
+
+class adm300reading(object):
+    """
+    Compact parsed ADM-300 sentence. Fields that weren't in the sentence are None. Supports read-only dictionary-style access, and toDict() returns the same dictionary parseSentence would.
+    """
+    
+    __slots__ = (
+        'seqNo', 'id', 'doseRt', 'doseAcc', 'doseRtUnf', 'rateAlarm', 'doseAlarm', 'battAlarm', 'probe', 'doseUnit', 'checksum',
+        'probeFlag', 'rateAlarmThresh', 'doseAlarmThresh', 'debugDataID', 'debugData', 'debugUnk', 'valid'
+    )
+    
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, None)
+        
+        self.valid = False
+    
+    def __getitem__(self, key):
+        try:
+            val = getattr(self, key)
+        
+        except AttributeError:
+            raise KeyError(key)
+        
+        if val is None:
+            raise KeyError(key)
+        
+        return val
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    def __repr__(self):
+        return "adm300reading(%r)" %(self.toDict())
+    
+    def get(self, key, default=None):
+        """
+        Get a field like dict.get().
+        """
+        
+        try:
+            val = self[key]
+        
+        except KeyError:
+            val = default
+        
+        return val
+    
+    def keys(self):
+        """
+        Names of the fields that are set.
+        """
+        
+        return [field for field in self.__slots__ if getattr(self, field) is not None]
+    
+    def toDict(self):
+        """
+        Convert to a dictionary.
+        """
+        
+        return dict((field, getattr(self, field)) for field in self.keys())
+
+
+class adm300lazyReading(object):
+    """
+    Lazily parsed ADM-300 sentence. Length, terminator, and checksum are checked up front, but each field is only decoded the first time it's read and is cached after that. Fields that go together, like the flags or the debug data, are decoded together. Supports the same access as adm300reading. Malformed fields raise ValueError when they're read.
+    """
+    
+    __slots__ = ('__sentence', '__parser', '__fields')
+    
+    def __init__(self, sentence, parser, valid):
+        self.__sentence = sentence
+        self.__parser = parser
+        self.__fields = {'valid': valid}
+    
+    def __getitem__(self, key):
+        fields = self.__fields
+        val = fields.get(key)
+        
+        # Decode it the first time it's read.
+        if (val is None) and (key not in fields) and fields['valid'] and (key in adm300reading.__slots__):
+            fields.update(self.__parser.decodeField(self.__sentence, key))
+            val = fields.get(key)
+        
+        if val is None:
+            raise KeyError(key)
+        
+        return val
+    
+    def __getattr__(self, key):
+        # Fields read as attributes are None if they weren't in the sentence, like adm300reading.
+        if key not in adm300reading.__slots__:
+            raise AttributeError(key)
+        
+        return self.get(key)
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    def __repr__(self):
+        return "adm300lazyReading(%r)" %(self.__sentence)
+    
+    def get(self, key, default=None):
+        """
+        Get a field like dict.get().
+        """
+        
+        try:
+            val = self[key]
+        
+        except KeyError:
+            val = default
+        
+        return val
+    
+    def keys(self):
+        """
+        Names of the fields that are set. Decodes everything.
+        """
+        
+        return [field for field in adm300reading.__slots__ if self.get(field) is not None]
+    
+    def toDict(self):
+        """
+        Convert to a dictionary. Decodes everything.
+        """
+        
+        return dict((field, self[field]) for field in self.keys())
+
 
 class adm300parse:
-    def __init__(self, debug=False):
+    # Every well-formed NNNSE/NNSE token decoded, keyed by the raw token. Built on first use and shared between instances.
+    __numTable = None
+    
+    # The same table keyed by raw bytes, for fields sliced out of byte buffers. It's the same dict on Python 2.
+    __numTableRaw = None
+    
+    def __init__(self, debug=False, compact=False, checksum=True, lazy=False):
         """
-        Python class parse sentences from Canberra/NRC ADM-300 survey meter.
+        Python class parse sentences from Canberra/NRC ADM-300 survey meter. If compact is set parseSentence returns adm300reading objects instead of dictionaries. If checksum is set sentences with bad checksums are invalid. If lazy is set parseSentence returns adm300lazyReading objects that only decode the fields that are read.
         """
         
         # Debug?
         self.__debug = debug
         self.__dName = "adm300parse"
         
+        # Return adm300reading objects?
+        self.__compact = compact
+        
+        # Return adm300lazyReading objects?
+        self.__lazy = lazy
+        
+        # Verify checksums?
+        self.__checksum = checksum
+        
         # Fixed-length sentence.
-        self.__sentenceLen = 47
+        self.__sentenceLen = adm300framer.sentenceLen
         
         # Data sentence info
         self.__readingOver = "]"
         
+        # Sent by the ADM-300 when it powers on.
+        self.__powerOn = chr(0x01)
+        
         # These chars are sent on boot...
         self.__bootChars = [0x00, 0x00] # FIX ME!!!
         
+        # The checksum is the XOR of every byte before it, XORed with 0x07. Found with cksumSearch.py.
+        # We XOR the covered bytes 4 at a time and fold the result down to a byte.
+        self.__cksumWords = struct.Struct("<11I")
+        self.__cksumXorOut = 0x07
+        
+        # parseBatch columns and their array types.
+        self.__batchColumns = [
+            ('seqNo', 'l'),
+            ('doseRt', 'd'),
+            ('doseAcc', 'd'),
+            ('doseRtUnf', 'd'),
+            ('rateAlarm', 'B'),
+            ('doseAlarm', 'B'),
+            ('battAlarm', 'B'),
+            ('probe', 'B'),
+            ('checksum', 'l'),
+            ('valid', 'B')
+        ]
+        
+        # Multi-char fields of a whole sentence for parseBatch: seqNo, doseRt, doseAcc, doseRtUnf and the checksum.
+        self.__batchFields = struct.Struct("2s1x5s1x5s1x5s24x2s1x")
+        
+        # Two-digit hex checksums, keyed by raw bytes.
+        self.__hexTable = {}
+        
+        for num in range(256):
+            for hexStr in ("%02X" %(num), "%02x" %(num)):
+                self.__hexTable[hexStr.encode('latin-1')] = num
+        
+        # Byte translation tables for parseBatch's rate, dose and battery flags. Anything not listed maps to 2.
+        self.__batchFlagTables = []
+        
+        for flags in ({".": 0, "R": 1}, {".": 0, "D": 1}, {".": 0, "B": 1}):
+            table = bytearray([2] * 256)
+            
+            for flag, val in flags.items():
+                table[ord(flag)] = val
+            
+            self.__batchFlagTables.append(bytes(table))
+        
+        # XORs every byte with the checksum's final XOR.
+        self.__cksumXorTable = bytes(bytearray(num ^ self.__cksumXorOut for num in range(256)))
+        
+        # Alarm flag chars for classifyFlags.
+        self.__rtFlags = {".": False, "R": True}
+        self.__doFlags = {".": False, "D": True}
+        self.__btFlags = {".": False, "B": True}
+        
         # Symbols.
         self.__symR = "R"
         self.__symSv = "Sv" # Not implemented.
@@ -64,6 +266,14 @@ class adm300parse:
         
         return self.__sentenceLen
     
+    @property
+    def powerOnChar(self):
+        """
+        Character the ADM-300 sends when it powers on.
+        """
+        
+        return self.__powerOn
+    
     def parseNumNotation(self, sciStr):
         """
         Take numbers in NNNSE or NNSE notation and convert them to decimals.
@@ -114,6 +324,90 @@ class adm300parse:
         return num
     
     
+    def decodeNum(self, sciStr):
+        """
+        Take numbers in NNNSE or NNSE notation and return them as decimals rounded to 6 places. Well-formed tokens are looked up in a precomputed table.
+        """
+        
+        numTable = self.__numTable
+        
+        if numTable is None:
+            numTable = self.__buildNumTable()
+        
+        try:
+            num = numTable[sciStr]
+        
+        except KeyError:
+            # Not a token the ADM-300 sends, so decode it the slow way. It isn't remembered so garbage can't grow the table.
+            num = round(self.parseNumNotation(sciStr), 6)
+        
+        return num
+    
+    
+    def __buildNumTable(self):
+        """
+        Decode every NNNSE and NNSE token. There are only 22,000 of them.
+        """
+        
+        numTable = {}
+        
+        # Same arithmetic as parseNumNotation so the results match exactly.
+        for exp in range(10):
+            for signStr, scale in (("+", math.pow(10.0, exp)), ("-", math.pow(.1, exp))):
+                for num in range(1000):
+                    numTable["%03d%s%d" %(num, signStr, exp)] = round((num / 100000.0) * scale, 6)
+                
+                for num in range(100):
+                    numTable["%02d%s%d" %(num, signStr, exp)] = round((num / 10000.0) * scale, 6)
+        
+        if str is bytes:
+            adm300parse.__numTableRaw = numTable
+        
+        else:
+            adm300parse.__numTableRaw = dict((token.encode('latin-1'), num) for token, num in numTable.items())
+        
+        adm300parse.__numTable = numTable
+        
+        return numTable
+    
+    
+    def computeChecksum(self, sentence):
+        """
+        Compute the checksum of a sentence.
+        """
+        
+        if not isinstance(sentence, bytes):
+            sentence = sentence.encode('latin-1')
+        
+        acc = 0
+        
+        for word in self.__cksumWords.unpack_from(sentence):
+            acc ^= word
+        
+        # Fold down to a byte.
+        acc ^= acc >> 16
+        acc ^= acc >> 8
+        
+        return (acc & 0xff) ^ self.__cksumXorOut
+    
+    
+    def checksumValid(self, sentence):
+        """
+        Does a stripped, full-length sentence have the right checksum? Always True if the parser isn't verifying checksums.
+        """
+        
+        if not self.__checksum:
+            return True
+        
+        try:
+            valid = (int(sentence[self.__readingStruct['cksum'][0]:self.__readingStruct['cksum'][1]], 16) == self.computeChecksum(sentence))
+        
+        except ValueError:
+            valid = False
+        
+        return valid
+    
+    
     def parseDebug(self, debugRaw, debugDat):
         """
         Parse debug data and dump a dictionary containing the new data.
@@ -128,11 +422,11 @@ class adm300parse:
             # Figure out what's in the debug data field and handle it.
             if debugID == "1":
                 # We have a dose rate alarm threshold.
-                retVal.update({'rateAlarmThresh': round(self.parseNumNotation(debugDat), 6)})
+                retVal.update({'rateAlarmThresh': self.decodeNum(debugDat)})
             
             elif debugID == "2":
                 # We have a dose alarm threshold.
-                retVal.update({'doseAlarmThresh': round(self.parseNumNotation(debugDat), 6)})
+                retVal.update({'doseAlarmThresh': self.decodeNum(debugDat)})
             
             else:
                 # ???
@@ -153,11 +447,174 @@ class adm300parse:
         return retVal 
     
     
+    def classifyFlags(self, sentence):
+        """
+        Fast check of just the flags in a serial sentence from the ADM-300, without decoding anything else. Returns None if the sentence isn't valid, or a tuple of the rate alarm, dose alarm, and battery alarm flags and the raw probe char.
+        """
+        
+        # Frames are usually exactly a sentence long, so only strip when we have to.
+        if len(sentence) != self.__sentenceLen:
+            sentence = sentence.strip()
+        
+        # Do we have a sentence of the appropriate length with the correct ending char and checksum?
+        if (len(sentence) != self.__sentenceLen) or (sentence[46:47] != self.__readingOver) or (not self.checksumValid(sentence)):
+            return None
+        
+        flgS = self.__readingStruct['flgRaw'][0]
+        
+        try:
+            return (self.__rtFlags[sentence[flgS]], self.__doFlags[sentence[flgS + 1]], self.__btFlags[sentence[flgS + 2]], sentence[flgS + 3])
+        
+        except KeyError:
+            return None
+    
+    
+    def parseFlags(self, flgRaw):
+        """
+        Parse the raw flag field. Returns a tuple of the rate alarm, dose alarm, and battery alarm flags, and the probe description.
+        """
+        
+        # Split flag strings...
+        rtAl = flgRaw[0:1]
+        doAl = flgRaw[1:2]
+        btAl = flgRaw[2:3]
+        prb = flgRaw[3:4]
+        
+        # Rate alarm triggered?
+        if rtAl == ".":
+            rateAlarm = False
+        elif rtAl == "R":
+            rateAlarm = True
+        else:
+            raise ValueError
+        
+        # Dose alarm triggered?
+        if doAl == ".":
+            doseAlarm = False
+        elif doAl == "D":
+            doseAlarm = True
+        else:
+            raise ValueError
+        
+        # Battery alarm triggered?
+        if btAl == ".":
+            battAlarm = False
+        elif btAl == "B":
+            battAlarm = True
+        else:
+            raise ValueError
+        
+        # Which probe are we getting info from?
+        if prb == "L":
+            probe = "Internal low range"
+        elif prb == "G":
+            probe = "Internal high range"
+        else:
+            # Not sure what this changes to if there's an external probe attached...
+            probe = "Unknown"
+        
+        return (rateAlarm, doseAlarm, battAlarm, probe)
+    
+    
+    def __parseCompact(self, sentence):
+        """
+        Parse a serial sentence from the ADM-300 into an adm300reading.
+        """
+        
+        reading = adm300reading()
+        
+        # Strip whitespace.
+        sentence = sentence.strip()
+        
+        # Do we have a sentence of the appropriate length with the correct ending char and checksum?
+        if (len(sentence) == self.__sentenceLen) and (sentence[46:47] == self.__readingOver) and self.checksumValid(sentence):
+            rs = self.__readingStruct
+            
+            reading.rateAlarm, reading.doseAlarm, reading.battAlarm, reading.probe = self.parseFlags(sentence[rs['flgRaw'][0]:rs['flgRaw'][1]])
+            reading.seqNo = int(sentence[rs['seqNo'][0]:rs['seqNo'][1]])
+            reading.id = sentence[rs['id'][0]:rs['id'][1]]
+            reading.doseRt = self.decodeNum(sentence[rs['rtRaw'][0]:rs['rtRaw'][1]])
+            reading.doseAcc = self.decodeNum(sentence[rs['dsRaw'][0]:rs['dsRaw'][1]])
+            reading.doseRtUnf = self.decodeNum(sentence[rs['uRtRaw'][0]:rs['uRtRaw'][1]])
+            reading.doseUnit = self.__symR
+            reading.checksum = int(sentence[rs['cksum'][0]:rs['cksum'][1]], 16)
+            
+            # Extract what we can from the debug data.
+            for key, val in self.parseDebug(sentence[rs['dbgRaw'][0]:rs['dbgRaw'][1]], sentence[rs['dbgDat'][0]:rs['dbgDat'][1]]).iteritems():
+                setattr(reading, key, val)
+            
+            # Set valid flag.
+            reading.valid = True
+        
+        return reading
+    
+    
+    def parseLazy(self, sentence):
+        """
+        Check a serial sentence from the ADM-300 and return an adm300lazyReading that decodes fields as they're read.
+        """
+        
+        # Strip whitespace.
+        sentence = sentence.strip()
+        
+        # Do we have a sentence of the appropriate length with the correct ending char and checksum?
+        valid = (len(sentence) == self.__sentenceLen) and (sentence[46:47] == self.__readingOver) and self.checksumValid(sentence)
+        
+        return adm300lazyReading(sentence, self, valid)
+    
+    
+    def decodeField(self, sentence, field):
+        """
+        Decode one field of a stripped, valid sentence. Returns a dictionary of decoded fields, since the flags and debug data are decoded a group at a time. Unknown fields return an empty dictionary.
+        """
+        
+        rs = self.__readingStruct
+        
+        if field == 'seqNo':
+            retVal = {'seqNo': int(sentence[rs['seqNo'][0]:rs['seqNo'][1]])}
+        
+        elif field == 'id':
+            retVal = {'id': sentence[rs['id'][0]:rs['id'][1]]}
+        
+        elif field == 'doseRt':
+            retVal = {'doseRt': self.decodeNum(sentence[rs['rtRaw'][0]:rs['rtRaw'][1]])}
+        
+        elif field == 'doseAcc':
+            retVal = {'doseAcc': self.decodeNum(sentence[rs['dsRaw'][0]:rs['dsRaw'][1]])}
+        
+        elif field == 'doseRtUnf':
+            retVal = {'doseRtUnf': self.decodeNum(sentence[rs['uRtRaw'][0]:rs['uRtRaw'][1]])}
+        
+        elif field in ('rateAlarm', 'doseAlarm', 'battAlarm', 'probe'):
+            retVal = dict(zip(('rateAlarm', 'doseAlarm', 'battAlarm', 'probe'), self.parseFlags(sentence[rs['flgRaw'][0]:rs['flgRaw'][1]])))
+        
+        elif field == 'doseUnit':
+            retVal = {'doseUnit': self.__symR}
+        
+        elif field == 'checksum':
+            retVal = {'checksum': int(sentence[rs['cksum'][0]:rs['cksum'][1]], 16)}
+        
+        elif field in ('probeFlag', 'rateAlarmThresh', 'doseAlarmThresh', 'debugDataID', 'debugData', 'debugUnk'):
+            retVal = {'probeFlag': None, 'rateAlarmThresh': None, 'doseAlarmThresh': None, 'debugDataID': None, 'debugData': None, 'debugUnk': None}
+            retVal.update(self.parseDebug(sentence[rs['dbgRaw'][0]:rs['dbgRaw'][1]], sentence[rs['dbgDat'][0]:rs['dbgDat'][1]]))
+        
+        else:
+            retVal = {}
+        
+        return retVal
+    
+    
     def parseSentence(self, sentence):
         """
-        Parse a serial sentence from the ADM-300.
+        Parse a serial sentence from the ADM-300. Returns a dictionary, an adm300reading if the parser was created with compact set, or an adm300lazyReading if it was created with lazy set.
         """
         
+        if self.__lazy:
+            return self.parseLazy(sentence)
+        
+        if self.__compact:
+            return self.__parseCompact(sentence)
+        
         # Valid flag - assume it's invalid until we have validated it.
         valid = False
         
@@ -168,67 +625,28 @@ class adm300parse:
             # Strip whitespace.
             sentence = sentence.strip()
             
-            # Do we have a sentence of the appropriate length with the correct ending char?
-            if (len(sentence) == self.__sentenceLen) and (sentence[46:47] == self.__readingOver):
+            # Do we have a sentence of the appropriate length with the correct ending char and checksum?
+            if (len(sentence) == self.__sentenceLen) and (sentence[46:47] == self.__readingOver) and self.checksumValid(sentence):
                 # For each entry in the 
                 for part in self.__readingStruct:
                     # Tack in pieces of the structure.
                     retVal.update({part: sentence[self.__readingStruct[part][0]:self.__readingStruct[part][1]]})
                 
-                # Get flag.
-                rFlg = retVal.pop('flgRaw')
-                
-                # Split flag strings...
-                rtAl = rFlg[0:1]
-                doAl = rFlg[1:2]
-                btAl = rFlg[2:3]
-                prb = rFlg[3:4]
-                
-                # Rate alarm triggered?
-                if rtAl == ".":
-                    rateAlarm = False
-                elif rtAl == "R":
-                    rateAlarm = True
-                else:
-                    raise ValueError
-                
-                # Dose alarm triggered?
-                if doAl == ".":
-                    doseAlarm = False
-                elif doAl == "D":
-                    doseAlarm = True
-                else:
-                    raise ValueError
-                
-                # Dose alarm triggered?
-                if btAl == ".":
-                    battAlarm = False
-                elif btAl == "B":
-                    battAlarm = True
-                else:
-                    raise
-                
-                # Which probe are we getting info from?
-                if prb == "L":
-                    probe = "Internal low range"
-                elif prb == "G":
-                    probe = "Internal high range"
-                else:
-                    # Not sure what this changes to if there's an external probe attached...
-                    probe = "Unknown"
+                # Get flags.
+                rateAlarm, doseAlarm, battAlarm, probe = self.parseFlags(retVal.pop('flgRaw'))
                 
                 # Update our return value with data.
                 retVal.update({
                     'seqNo': int(retVal['seqNo']), # Sequence number. Starts at 1 when readings start.
-                    'doseRt': round(self.parseNumNotation(retVal.pop('rtRaw')), 6), # Dose rate.
-                    'doseAcc': round(self.parseNumNotation(retVal.pop('dsRaw')), 6), # Accumulated dose.
-                    'doseRtUnf': round(self.parseNumNotation(retVal.pop('uRtRaw')), 6), # "Unfiltered" dose rate.
+                    'doseRt': self.decodeNum(retVal.pop('rtRaw')), # Dose rate.
+                    'doseAcc': self.decodeNum(retVal.pop('dsRaw')), # Accumulated dose.
+                    'doseRtUnf': self.decodeNum(retVal.pop('uRtRaw')), # "Unfiltered" dose rate.
                     'rateAlarm': rateAlarm, # Is the dose rate alarm active?
                     'doseAlarm': doseAlarm, # Is the accumulated dose alarm active?
                     'battAlarm': battAlarm, # Is the low battery alarm active?
                     'probe': probe, # Probe information.
                     'doseUnit': self.__symR, # This should be set up as either R/hr or Sv/hr depending on decimal placement in dose rate? IDK.
-                    'checksum': int(retVal.pop('cksum'), 16) # Checksum as integer. Need to verify it.
+                    'checksum': int(retVal.pop('cksum'), 16) # Checksum as integer.
                 })
                 
                 # Extract what we can from the debug data.
@@ -252,3 +670,263 @@ class adm300parse:
             retVal.update({'valid': valid})
         
         return retVal
+
+    
+    
+    def parseBatch(self, source):
+        """
+        Parse a batch of serial sentences from the ADM-300 into columnar data. The source can be a list of sentences, a file-like object, or a string containing newline-separated sentences. Returns a dictionary of arrays with one element per non-blank sentence. Invalid sentences get zeroed fields and a valid flag of 0. The probe column holds the character code of the raw probe flag.
+        
+        Sentences of the right shape are joined into one buffer and decoded a column at a time: single-char fields and the checksum are strided slices of the buffer, and the multi-char fields come out of one struct.
+        """
+        
+        # Columns we return.
+        retVal = dict((col, array.array(code)) for col, code in self.__batchColumns)
+        
+        # Break string blobs into lines.
+        if isinstance(source, str):
+            source = source.splitlines()
+        
+        # Strip whitespace and skip blank lines.
+        sentences = [sentence for sentence in (line.strip() for line in source) if sentence]
+        
+        # Only sentences of the appropriate length with the correct ending char get decoded.
+        sentenceLen = self.__sentenceLen
+        readingOver = self.__readingOver
+        shaped = [i for i, sentence in enumerate(sentences) if (len(sentence) == sentenceLen) and (sentence[sentenceLen - 1] == readingOver)]
+        blob = "".join([sentences[i] for i in shaped])
+        
+        if not isinstance(blob, bytes):
+            try:
+                blob = blob.encode('latin-1')
+            
+            except UnicodeError:
+                # Something in there can't have come off the serial port.
+                shaped = [i for i in shaped if self.__isLatin1(sentences[i])]
+                blob = "".join([sentences[i] for i in shaped]).encode('latin-1')
+        
+        count = len(shaped)
+        
+        if count:
+            decoded, valid = self.__decodeBlob(blob, count)
+        
+        else:
+            decoded, valid = [[]] * (len(self.__batchColumns) - 1), []
+        
+        # Fast path: every sentence was good.
+        if (count == len(sentences)) and all(valid):
+            for (col, code), vals in zip(self.__batchColumns, decoded):
+                retVal[col].extend(vals)
+            
+            retVal['valid'].extend(itertools.repeat(1, count))
+            
+            return retVal
+        
+        # Put the good rows back where they came from and zero the rest.
+        keep = list(itertools.compress(shaped, valid))
+        
+        for (col, code), vals in zip(self.__batchColumns, decoded + [None]):
+            column = [0] * len(sentences)
+            
+            if vals is None:
+                for i in keep:
+                    column[i] = 1
+            
+            else:
+                for i, val in zip(keep, itertools.compress(vals, valid)):
+                    column[i] = val
+            
+            retVal[col].extend(column)
+        
+        return retVal
+    
+    
+    def __decodeBlob(self, blob, count):
+        """
+        Decode count back-to-back sentences. Returns a list of decoded columns in __batchColumns order, less valid, and a list of row validity. Fields of invalid rows can be anything.
+        """
+        
+        sentenceLen = self.__sentenceLen
+        flgS = self.__readingStruct['flgRaw'][0]
+        
+        # Rows with a field we can't decode.
+        bad = set()
+        
+        # Multi-char fields.
+        fields = self.__batchFields
+        
+        try:
+            rows = fields.iter_unpack(blob)
+        
+        except AttributeError:
+            # Python 2 doesn't have iter_unpack.
+            rows = [fields.unpack_from(blob, offset) for offset in range(0, len(blob), sentenceLen)]
+        
+        seq, rt, ds, uRt, ck = zip(*rows)
+        
+        numTable = self.__numTableRaw
+        
+        if numTable is None:
+            self.__buildNumTable()
+            numTable = self.__numTableRaw
+        
+        decoded = [
+            self.__mapColumn(seq, int, int, bad),
+            self.__mapColumn(rt, numTable.__getitem__, self.__decodeRawNum, bad),
+            self.__mapColumn(ds, numTable.__getitem__, self.__decodeRawNum, bad),
+            self.__mapColumn(uRt, numTable.__getitem__, self.__decodeRawNum, bad)
+        ]
+        
+        # Flags are one char each, so each is a strided slice mapped through a table. Anything that isn't a known flag maps to 2.
+        for offset, table in enumerate(self.__batchFlagTables):
+            flags = blob[flgS + offset::sentenceLen].translate(table)
+            decoded.append(list(bytearray(flags)))
+            
+            if b"\x02" in flags:
+                bad.update(i for i, flag in enumerate(bytearray(flags)) if flag == 2)
+        
+        # The probe column is just the char codes.
+        decoded.append(list(bytearray(blob[flgS + 3::sentenceLen])))
+        
+        ckVals = self.__mapColumn(ck, self.__hexTable.__getitem__, self.__parseHex, bad)
+        decoded.append(ckVals)
+        
+        if self.__checksum:
+            # Folding the XOR of the 32-bit words down to a byte is the XOR of every covered byte, so XOR the covered byte columns of the whole batch together as big integers.
+            acc = 0
+            
+            for offset in range(self.__cksumWords.size):
+                acc ^= int(binascii.hexlify(blob[offset::sentenceLen]), 16)
+            
+            sums = bytearray(binascii.unhexlify("%0*x" %(count * 2, acc)).translate(self.__cksumXorTable))
+            valid = list(map(operator.eq, sums, ckVals))
+        
+        else:
+            valid = [True] * count
+        
+        for i in bad:
+            valid[i] = False
+        
+        return decoded, valid
+    
+    
+    def __mapColumn(self, col, fast, slow, bad):
+        """
+        Decode a column with fast, retrying anything it rejects with slow. Rows that slow can't decode get None and are added to bad.
+        """
+        
+        try:
+            return list(map(fast, col))
+        
+        except (ValueError, KeyError):
+            None
+        
+        retVal = []
+        
+        for i, field in enumerate(col):
+            try:
+                retVal.append(fast(field))
+            
+            except (ValueError, KeyError):
+                try:
+                    retVal.append(slow(field))
+                
+                except (ValueError, KeyError):
+                    retVal.append(None)
+                    bad.add(i)
+        
+        return retVal
+    
+    
+    def __isLatin1(self, sentence):
+        """
+        Can a sentence be encoded as latin-1?
+        """
+        
+        try:
+            sentence.encode('latin-1')
+        
+        except UnicodeError:
+            return False
+        
+        return True
+    
+    
+    def __decodeRawNum(self, sciRaw):
+        """
+        decodeNum for a field sliced out of a byte buffer.
+        """
+        
+        if not isinstance(sciRaw, str):
+            sciRaw = sciRaw.decode('latin-1')
+        
+        return self.decodeNum(sciRaw)
+    
+    
+    def __parseHex(self, hexStr):
+        """
+        Parse a hex checksum field.
+        """
+        
+        return int(hexStr, 16)
+    
+    
+    def readCapture(self, path, offset=0):
+        """
+        Generator that memory-maps a raw capture file and lazily parses each sentence found in it. Garbage, boot chars and power on chars between sentences are skipped. Yields a tuple of the offset just past the sentence and the parsed sentence, so a reader can resume by passing that offset back in.
+        """
+        
+        with open(path, 'rb') as captureFile:
+            try:
+                capture = mmap.mmap(captureFile.fileno(), 0, access=mmap.ACCESS_READ)
+            
+            except ValueError:
+                # Empty files can't be mapped.
+                return
+            
+            try:
+                pos = offset
+                
+                # End of the last sentence we handed out. Nothing before it can be part of another one.
+                lastEnd = offset
+                
+                while True:
+                    # Find the end of the next candidate sentence.
+                    end = capture.find(self.__readingOver, pos)
+                    
+                    if end < 0:
+                        break
+                    
+                    # Where would the sentence start?
+                    start = end - self.__sentenceLen + 1
+                    pos = end + 1
+                    
+                    # Not enough data since the last sentence? Resync on the next one.
+                    if start < lastEnd:
+                        continue
+                    
+                    try:
+                        parsed = self.parseSentence(capture[start:pos])
+                    
+                    except ValueError:
+                        # Garbage that happens to end in the right char.
+                        continue
+                    
+                    if parsed['valid']:
+                        lastEnd = pos
+                        yield (pos, parsed)
+            
+            finally:
+                capture.close()
+
+    
+    
+    def extractFrames(self, buf):
+        """
+        Split complete sentences and power on chars out of a buffer of raw serial data. Returns a tuple containing a list of frames and the unconsumed remainder of the buffer. Power on chars are returned as their own frames. This is a one-shot wrapper around adm300framer.
+        """
+        
+        framer = adm300framer.adm300framer(self.__sentenceLen)
+        frames = framer.feed(buf)
+        
+        return (frames, framer.partial)
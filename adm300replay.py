@@ -0,0 +1,252 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import array
+import errno
+import fcntl
+import os
+import termios
+import threading
+import time
+import adm300framer
+
+class adm300replay:
+    def __init__(self, path, speed=1.0, baud=300, debug=False):
+        """
+        Replays a raw ADM-300 capture as if it were a serial port. Pass it to adm300comm as port to drive the normal callbacks. Real time is the rate baud can carry the capture, speed multiplies that, and a speed of 0 replays as fast as the reader keeps up.
+        """
+        
+        # Set class-wide properties.
+        self.__path = path
+        self.__speed = speed
+        self.__baud = baud
+        self.__debug = debug
+        self.__dName = "adm300replay"
+        
+        # How much we write at once when going as fast as possible.
+        self.__chunkSize = 4096
+        
+        # Frames what we send so only real sentences are counted, not stray sentence end chars.
+        self.__framer = adm300framer.adm300framer()
+        
+        # Counters.
+        self.__bytesSent = 0
+        self.__sentenceCount = 0
+        self.__cmdCount = 0
+        self.__startTime = None
+        self.__endTime = None
+        
+        # Set when the whole capture has been written.
+        self.__done = threading.Event()
+        
+        # This flag tells us if we should keep running.
+        self.__keepRunning = True
+        
+        # The read end of this pipe stands in for the serial port.
+        self.__rd, self.__wr = os.pipe()
+    
+    @property
+    def bytesSent(self):
+        """
+        How many bytes of the capture we've replayed.
+        """
+        
+        return self.__bytesSent
+    
+    @property
+    def sentenceCount(self):
+        """
+        How many sentences we've replayed.
+        """
+        
+        return self.__sentenceCount
+    
+    @property
+    def cmdCount(self):
+        """
+        How many commands were written to us.
+        """
+        
+        return self.__cmdCount
+    
+    @property
+    def done(self):
+        """
+        Has the whole capture been replayed?
+        """
+        
+        return self.__done.is_set()
+    
+    @property
+    def sentencesPerSec(self):
+        """
+        Sentences per second we've achieved so far.
+        """
+        
+        if self.__startTime is None:
+            return 0.0
+        
+        endTime = self.__endTime
+        
+        if endTime is None:
+            endTime = time.time()
+        
+        elapsed = endTime - self.__startTime
+        
+        if elapsed <= 0:
+            return 0.0
+        
+        return self.__sentenceCount / elapsed
+    
+    def waitDone(self, timeout=None):
+        """
+        Wait for the replay to finish. Returns whether it did.
+        """
+        
+        return self.__done.wait(timeout)
+    
+    def fileno(self):
+        """
+        File descriptor to wait on for data, like a serial port.
+        """
+        
+        return self.__rd
+    
+    def inWaiting(self):
+        """
+        How many bytes are waiting to be read.
+        """
+        
+        buf = array.array('i', [0])
+        fcntl.ioctl(self.__rd, termios.FIONREAD, buf, True)
+        
+        return buf[0]
+    
+    def read(self, size=1):
+        """
+        Read replayed data.
+        """
+        
+        return os.read(self.__rd, size)
+    
+    def write(self, data):
+        """
+        Commands sent to the replayed ADM-300 are counted and dropped.
+        """
+        
+        if self.__debug: print("%s: Dropping command %s." %(self.__dName, data))
+        
+        self.__cmdCount += 1
+        
+        return len(data)
+    
+    def close(self):
+        """
+        Stop replaying and close the pipe.
+        """
+        
+        self.__keepRunning = False
+        
+        for fd in (self.__rd, self.__wr):
+            try:
+                os.close(fd)
+            
+            except OSError:
+                None
+    
+    def __send(self, data):
+        """
+        Write data to the pipe, blocking if the reader is behind.
+        """
+        
+        while data:
+            try:
+                sent = os.write(self.__wr, data)
+            
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                
+                raise
+            
+            self.__bytesSent += sent
+            
+            for frame in self.__framer.feed(data[:sent]):
+                if len(frame) == adm300framer.sentenceLen:
+                    self.__sentenceCount += 1
+            
+            data = data[sent:]
+    
+    def __replayThread(self):
+        """
+        This thread writes the capture into the pipe.
+        """
+        
+        if self.__debug: print("%s: Start replay of %s..." %(self.__dName, self.__path))
+        
+        self.__startTime = time.time()
+        
+        # Seconds per byte on the wire.
+        if self.__speed and self.__baud:
+            byteTime = 10.0 / (self.__baud * self.__speed)
+        else:
+            byteTime = 0.0
+        
+        try:
+            with open(self.__path, 'rb') as capture:
+                if byteTime:
+                    # Send a line at a time so sentences arrive on schedule.
+                    for line in capture:
+                        if not self.__keepRunning:
+                            break
+                        
+                        # Wait until the wire would have carried this line.
+                        delay = self.__startTime + ((self.__bytesSent + len(line)) * byteTime) - time.time()
+                        
+                        if delay > 0:
+                            time.sleep(delay)
+                        
+                        self.__send(line)
+                
+                else:
+                    while self.__keepRunning:
+                        chunk = capture.read(self.__chunkSize)
+                        
+                        if not chunk:
+                            break
+                        
+                        self.__send(chunk)
+        
+        except OSError:
+            # Closed under us.
+            if self.__keepRunning:
+                raise
+        
+        finally:
+            self.__endTime = time.time()
+            self.__done.set()
+        
+        if self.__debug: print("%s: Replayed %s sentences at %.1f/sec." %(self.__dName, self.__sentenceCount, self.sentencesPerSec))
+    
+    def begin(self):
+        """
+        Start replaying.
+        """
+        
+        self.__replayWk = threading.Thread(target=self.__replayThread)
+        self.__replayWk.daemon = True
+        self.__replayWk.start()
@@ -0,0 +1,232 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+class adm300scheduler:
+    def __init__(self, timeout=10.0):
+        """
+        Command scheduler for adm300comm. Pending commands go out lowest priority number first and in order within a priority. A command queued while an identical one is still pending is coalesced into it. Once a command is written we wait up to timeout seconds for a sentence that reflects it, then report whether it completed.
+        """
+        
+        self.__timeout = timeout
+        
+        # Pending commands as a heap of (priority, order, command), and the same commands by what goes on the wire.
+        self.__pending = []
+        self.__pendingByData = {}
+        self.__order = itertools.count()
+        
+        # Written commands waiting for a sentence that reflects them.
+        self.__inFlight = []
+        
+        # Counters.
+        self.__lock = threading.Lock()
+        self.__queued = 0
+        self.__coalesced = 0
+        self.__written = 0
+        self.__completed = 0
+        self.__failed = 0
+    
+    @property
+    def counters(self):
+        """
+        Returns a dictionary of how many commands were queued, coalesced into a pending one, written, completed, and failed, and how many are pending or waiting on a sentence.
+        """
+        
+        with self.__lock:
+            return {
+                'queued': self.__queued,
+                'coalesced': self.__coalesced,
+                'written': self.__written,
+                'completed': self.__completed,
+                'failed': self.__failed,
+                'pending': len(self.__pendingByData),
+                'inFlight': len(self.__inFlight)
+            }
+    
+    def put(self, name, data, priority=1, confirm=None):
+        """
+        Queue a command. Data is what goes on the wire. Confirm is called with each parsed sentence after the command is written and returns True once a sentence reflects it. Commands without one complete when they're written. Returns True if the command was coalesced into one that was already pending.
+        """
+        
+        with self.__lock:
+            self.__queued += 1
+            cmd = self.__pendingByData.get(data)
+            
+            if cmd is not None:
+                # Already waiting to go out. Keep the original enqueue time but take the more urgent priority.
+                self.__coalesced += 1
+                cmd['coalesced'] += 1
+                
+                if priority < cmd['priority']:
+                    cmd['priority'] = priority
+                    heapq.heappush(self.__pending, (priority, next(self.__order), cmd))
+                
+                return True
+            
+            cmd = {
+                'name': name,
+                'data': data,
+                'priority': priority,
+                'confirm': confirm,
+                'queued': time.time(),
+                'written': None,
+                'coalesced': 0
+            }
+            
+            self.__pendingByData[data] = cmd
+            heapq.heappush(self.__pending, (priority, next(self.__order), cmd))
+        
+        return False
+    
+    def hasPending(self):
+        """
+        Is anything waiting to be written?
+        """
+        
+        with self.__lock:
+            return bool(self.__pendingByData)
+    
+    def next(self):
+        """
+        Pop the next command to write, or None if nothing is pending.
+        """
+        
+        with self.__lock:
+            while self.__pending:
+                priority, order, cmd = heapq.heappop(self.__pending)
+                
+                # Skip stale entries left behind when a coalesced command was bumped up.
+                if (self.__pendingByData.get(cmd['data']) is cmd) and (priority == cmd['priority']):
+                    del self.__pendingByData[cmd['data']]
+                    return cmd
+        
+        return None
+    
+    def __result(self, cmd, completed, now):
+        """
+        Build the report for a finished command.
+        """
+        
+        if completed:
+            self.__completed += 1
+        else:
+            self.__failed += 1
+        
+        return {
+            'name': cmd['name'],
+            'completed': completed,
+            'coalesced': cmd['coalesced'],
+            'writeSeconds': cmd['written'] - cmd['queued'],
+            'confirmSeconds': (now - cmd['queued']) if completed else None
+        }
+    
+    def written(self, cmd, now=None):
+        """
+        Mark a command from next() as written to the wire. Returns a list of results for commands that finished.
+        """
+        
+        if now is None:
+            now = time.time()
+        
+        retVal = []
+        
+        with self.__lock:
+            cmd['written'] = now
+            self.__written += 1
+            
+            if cmd['confirm'] is None:
+                retVal.append(self.__result(cmd, True, now))
+            
+            else:
+                self.__inFlight.append(cmd)
+        
+        return retVal
+    
+    def observe(self, reading, now=None):
+        """
+        Check a parsed sentence against written commands. Returns a list of results for commands that finished.
+        """
+        
+        if now is None:
+            now = time.time()
+        
+        retVal = []
+        
+        with self.__lock:
+            if not self.__inFlight:
+                return retVal
+            
+            waiting = []
+            
+            for cmd in self.__inFlight:
+                if now - cmd['written'] > self.__timeout:
+                    retVal.append(self.__result(cmd, False, now))
+                    continue
+                
+                try:
+                    done = cmd['confirm'](reading)
+                
+                except (KeyError, TypeError, ValueError):
+                    # The sentence doesn't have what we need to tell.
+                    done = False
+                
+                if done:
+                    retVal.append(self.__result(cmd, True, now))
+                else:
+                    waiting.append(cmd)
+            
+            self.__inFlight = waiting
+        
+        return retVal
+    
+    def expire(self, now=None):
+        """
+        Fail written commands that weren't reflected in time. Returns a list of results for them.
+        """
+        
+        if now is None:
+            now = time.time()
+        
+        retVal = []
+        
+        with self.__lock:
+            waiting = []
+            
+            for cmd in self.__inFlight:
+                if now - cmd['written'] > self.__timeout:
+                    retVal.append(self.__result(cmd, False, now))
+                else:
+                    waiting.append(cmd)
+            
+            self.__inFlight = waiting
+        
+        return retVal
+    
+    def nextDeadline(self):
+        """
+        When the next written command times out, or None if nothing is waiting.
+        """
+        
+        with self.__lock:
+            if not self.__inFlight:
+                return None
+            
+            return min(cmd['written'] for cmd in self.__inFlight) + self.__timeout
@@ -0,0 +1,373 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import errno
+import os
+import select
+import socket
+import struct
+import threading
+import time
+import adm300archive
+import adm300common
+
+# Every message is a type and payload length followed by the payload.
+frameHeader = struct.Struct("<BH")
+
+# Message types. Readings are packed like adm300archive records, so with the 3-byte header each one is 39 bytes on the wire. Raw sentences are sent as-is.
+msgReading = 1
+msgRaw = 2
+
+def sockFamily(address):
+    """
+    Unix socket paths are strings, TCP addresses are (host, port) tuples.
+    """
+    
+    if isinstance(address, str):
+        return socket.AF_UNIX
+    
+    return socket.AF_INET
+
+
+class adm300server:
+    def __init__(self, address=("127.0.0.1", 30300), maxBuffer=65536, debug=False):
+        """
+        Shares one adm300comm with many local clients over TCP or a unix socket. Address is a (host, port) tuple or a unix socket path. Pass publish() to setCallback() and publishRaw() to setRawCallback(), or call attach(). Messages are written without blocking, and clients that fall more than maxBuffer bytes behind are dropped so they can't hold up the serial thread.
+        """
+        
+        # Set class-wide properties.
+        self.__maxBuffer = maxBuffer
+        self.__debug = debug
+        self.__dName = "adm300server"
+        
+        # Unsent data by client socket.
+        self.__clients = {}
+        self.__lock = threading.Lock()
+        
+        # Dropped clients waiting for the server thread to close them. Only the server thread closes sockets so it never selects on a closed one.
+        self.__dead = []
+        
+        # Counters.
+        self.__accepted = 0
+        self.__dropped = 0
+        self.__messages = 0
+        
+        # This flag tells us if we should keep running.
+        self.__keepRunning = True
+        
+        # Pipe used to wake the server thread when a client has data waiting.
+        self.__waker = adm300common.adm300wakePipe()
+        
+        family = sockFamily(address)
+        
+        # Clear out a socket left behind by an earlier run.
+        if (family == socket.AF_UNIX) and os.path.exists(address):
+            os.unlink(address)
+        
+        self.__listen = socket.socket(family, socket.SOCK_STREAM)
+        
+        if family == socket.AF_INET:
+            self.__listen.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        
+        self.__listen.bind(address)
+        self.__listen.listen(16)
+        self.__listen.setblocking(False)
+        
+        if self.__debug: print("%s: Listening on %s." %(self.__dName, self.address))
+    
+    @property
+    def address(self):
+        """
+        The address we're listening on. Useful with port 0.
+        """
+        
+        return self.__listen.getsockname()
+    
+    @property
+    def counters(self):
+        """
+        Returns a dictionary of how many clients are connected, were accepted, and were dropped for falling behind, and how many messages were published.
+        """
+        
+        with self.__lock:
+            return {
+                'clients': len(self.__clients),
+                'accepted': self.__accepted,
+                'dropped': self.__dropped,
+                'messages': self.__messages
+            }
+    
+    def __drop(self, sock, why):
+        """
+        Disconnect a client. Call with the lock held. The server thread closes the socket.
+        """
+        
+        if self.__debug: print("%s: Dropping client, %s." %(self.__dName, why))
+        
+        del self.__clients[sock]
+        self.__dead.append(sock)
+        self.__waker.wake()
+    
+    def __closeDead(self):
+        """
+        Close the sockets of dropped clients. Only call from the server thread.
+        """
+        
+        with self.__lock:
+            dead = self.__dead
+            self.__dead = []
+        
+        for sock in dead:
+            try:
+                sock.close()
+            
+            except socket.error:
+                None
+    
+    def __flush(self, sock):
+        """
+        Send as much of a client's buffer as it'll take without blocking. Call with the lock held. Returns whether the client is still connected.
+        """
+        
+        buf = self.__clients[sock]
+        
+        try:
+            sent = sock.send(buf)
+        
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return True
+            
+            self.__drop(sock, "send failed")
+            return False
+        
+        del buf[:sent]
+        
+        return True
+    
+    def __queue(self, msgType, payload):
+        """
+        Frame a message and queue it for every client, sending right away when we can.
+        """
+        
+        frame = frameHeader.pack(msgType, len(payload)) + payload
+        backlog = False
+        
+        with self.__lock:
+            self.__messages += 1
+            
+            for sock in list(self.__clients):
+                buf = self.__clients[sock]
+                wasEmpty = not buf
+                buf.extend(frame)
+                
+                # Nothing ahead of it? Try to send it now.
+                if wasEmpty and (not self.__flush(sock)):
+                    continue
+                
+                if len(buf) > self.__maxBuffer:
+                    self.__dropped += 1
+                    self.__drop(sock, "too far behind")
+                
+                elif buf:
+                    backlog = True
+        
+        # Have the server thread finish sending.
+        if backlog:
+            self.__waker.wake()
+    
+    def publish(self, reading):
+        """
+        Send a parsed reading to every client. Invalid readings are skipped.
+        """
+        
+        if not reading['valid']:
+            return
+        
+        self.__queue(msgReading, adm300archive.packReading(reading, time.time()))
+    
+    def publishRaw(self, sentence):
+        """
+        Send a raw sentence to every client.
+        """
+        
+        if not isinstance(sentence, bytes):
+            sentence = sentence.encode('latin-1')
+        
+        self.__queue(msgRaw, sentence)
+    
+    def attach(self, comm):
+        """
+        Publish everything from an adm300comm. This takes over its parsed and raw callbacks.
+        """
+        
+        comm.setCallback(self.publish)
+        comm.setRawCallback(self.publishRaw)
+    
+    def __serverThread(self):
+        """
+        This thread accepts clients, notices when they go away, and finishes sending what publish() couldn't.
+        """
+        
+        if self.__debug: print("%s: Start server thread..." %(self.__dName))
+        
+        while self.__keepRunning:
+            self.__closeDead()
+            
+            with self.__lock:
+                socks = list(self.__clients)
+                writers = [sock for sock in socks if self.__clients[sock]]
+            
+            try:
+                readable, writable = select.select([self.__listen, self.__waker.fd] + socks, writers, [])[0:2]
+            
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                
+                raise
+            
+            if self.__waker.fd in readable:
+                self.__waker.drain()
+            
+            if self.__listen in readable:
+                try:
+                    conn, addr = self.__listen.accept()
+                
+                except socket.error:
+                    conn = None
+                
+                if conn is not None:
+                    if self.__debug: print("%s: Client connected from %s." %(self.__dName, addr))
+                    
+                    conn.setblocking(False)
+                    
+                    with self.__lock:
+                        self.__clients[conn] = bytearray()
+                        self.__accepted += 1
+            
+            with self.__lock:
+                for sock in readable:
+                    if sock not in self.__clients:
+                        continue
+                    
+                    # Clients don't talk to us, so this is a hangup or junk we throw away.
+                    try:
+                        data = sock.recv(4096)
+                    
+                    except socket.error as e:
+                        if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                            continue
+                        
+                        data = b""
+                    
+                    if not data:
+                        self.__drop(sock, "hung up")
+                
+                for sock in writable:
+                    if sock in self.__clients:
+                        self.__flush(sock)
+        
+        # Shut everything down.
+        with self.__lock:
+            for sock in list(self.__clients):
+                self.__drop(sock, "shutting down")
+        
+        self.__closeDead()
+        self.__listen.close()
+    
+    def begin(self):
+        """
+        Start accepting clients.
+        """
+        
+        self.__serverWk = threading.Thread(target=self.__serverThread)
+        self.__serverWk.daemon = True
+        self.__serverWk.start()
+    
+    def kill(self):
+        """
+        Disconnect every client and stop listening.
+        """
+        
+        self.__keepRunning = False
+        self.__waker.wake()
+
+
+class adm300client:
+    def __init__(self, address=("127.0.0.1", 30300), timeout=None):
+        """
+        Client for adm300server. Address is a (host, port) tuple or a unix socket path.
+        """
+        
+        self.__sock = socket.socket(sockFamily(address), socket.SOCK_STREAM)
+        self.__sock.connect(address)
+        self.__sock.settimeout(timeout)
+        
+        # Data we haven't got a whole message out of yet.
+        self.__buf = bytearray()
+    
+    def fileno(self):
+        """
+        File descriptor to wait on for messages.
+        """
+        
+        return self.__sock.fileno()
+    
+    def recv(self):
+        """
+        Wait for data and return a list of the complete messages we have. Readings are dictionaries like adm300archiveReader returns, raw sentences are strings. Raises EOFError if the server went away.
+        """
+        
+        data = self.__sock.recv(65536)
+        
+        if not data:
+            raise EOFError("adm300client: Server closed the connection.")
+        
+        buf = self.__buf
+        buf.extend(data)
+        
+        messages = []
+        pos = 0
+        
+        while len(buf) - pos >= frameHeader.size:
+            msgType, length = frameHeader.unpack_from(buf, pos)
+            end = pos + frameHeader.size + length
+            
+            if end > len(buf):
+                break
+            
+            payload = bytes(buf[pos + frameHeader.size:end])
+            
+            if msgType == msgReading:
+                messages.append(adm300archive.unpackRecord(payload))
+            
+            elif msgType == msgRaw:
+                messages.append(payload.decode('latin-1') if str is not bytes else payload)
+            
+            pos = end
+        
+        del buf[:pos]
+        
+        return messages
+    
+    def close(self):
+        """
+        Disconnect.
+        """
+        
+        self.__sock.close()
@@ -0,0 +1,282 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import mmap
+import os
+import struct
+import time
+import adm300archive
+
+# Ring header: magic, version, slot size, capacity, then a generation bumped each time a writer starts, then the number of records ever written.
+ringMagic = b"ADM300RB"
+ringVersion = 2
+ringHeader = struct.Struct("<8sHHI")
+ringGeneration = struct.Struct("<Q")
+ringGenerationOffset = ringHeader.size
+ringHead = struct.Struct("<Q")
+ringHeadOffset = ringGenerationOffset + ringGeneration.size
+
+# Slots start on their own cache line.
+ringSlotsOffset = 64
+
+# Each slot is a sequence number followed by an adm300archive record. The sequence is odd while the slot is being written and 2 * (record number + 1) once it's done.
+slotSeq = struct.Struct("<Q")
+slotSize = slotSeq.size + adm300archive.archiveRecord.size
+
+
+class adm300shmWriter:
+    def __init__(self, path="/dev/shm/adm300", capacity=4096):
+        """
+        Publishes ADM-300 readings to a fixed-layout ring buffer in shared memory for adm300shmReader in other processes. There must only be one writer, and it never waits on readers. Pass add() to adm300comm.setCallback() to publish everything the meter sends.
+        """
+        
+        self.__dName = "adm300shmWriter"
+        self.__path = path
+        self.__capacity = capacity
+        self.__count = 0
+        
+        size = ringSlotsOffset + (capacity * slotSize)
+        
+        # Readers of a ring left by an earlier writer may still have it mapped. Truncating it would make them fault, so only ever grow it.
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            
+            self.__map = mmap.mmap(fd, size)
+        
+        finally:
+            os.close(fd)
+        
+        # Carry the generation on from the last writer so its readers notice we started over.
+        generation = 0
+        magic, version = ringHeader.unpack_from(self.__map, 0)[:2]
+        
+        if (magic == ringMagic) and (version == ringVersion):
+            generation = ringGeneration.unpack_from(self.__map, ringGenerationOffset)[0]
+        
+        ringHeader.pack_into(self.__map, 0, ringMagic, ringVersion, slotSize, capacity)
+        ringHead.pack_into(self.__map, ringHeadOffset, 0)
+        ringGeneration.pack_into(self.__map, ringGenerationOffset, generation + 1)
+    
+    @property
+    def path(self):
+        """
+        Where the ring buffer lives.
+        """
+        
+        return self.__path
+    
+    @property
+    def count(self):
+        """
+        How many records we've written.
+        """
+        
+        return self.__count
+    
+    def add(self, reading, timestamp=None):
+        """
+        Add a parsed reading. Invalid readings are ignored.
+        """
+        
+        if not reading['valid']:
+            return
+        
+        if timestamp is None:
+            timestamp = time.time()
+        
+        num = self.__count
+        offset = ringSlotsOffset + ((num % self.__capacity) * slotSize)
+        
+        # Mark the slot busy, fill it, then mark it done before moving the head up.
+        slotSeq.pack_into(self.__map, offset, (num * 2) + 1)
+        self.__map[offset + slotSeq.size:offset + slotSize] = adm300archive.packReading(reading, timestamp)
+        slotSeq.pack_into(self.__map, offset, (num + 1) * 2)
+        
+        self.__count = num + 1
+        ringHead.pack_into(self.__map, ringHeadOffset, self.__count)
+    
+    def close(self, unlink=True):
+        """
+        Stop publishing, and remove the ring buffer unless unlink is False.
+        """
+        
+        self.__map.close()
+        
+        if unlink:
+            try:
+                os.unlink(self.__path)
+            
+            except OSError:
+                None
+
+
+class adm300shmReader:
+    def __init__(self, path="/dev/shm/adm300", fromStart=False):
+        """
+        Reads records published by adm300shmWriter in another process straight out of shared memory. Starts with the next record written unless fromStart is set, in which case it starts with the oldest one still in the ring. Readers that fall more than the ring's capacity behind skip ahead and count what they missed.
+        """
+        
+        self.__dName = "adm300shmReader"
+        self.__path = path
+        self.__map = None
+        self.__missed = 0
+        
+        self.__open()
+        
+        # Number of the next record we want.
+        if fromStart:
+            self.__next = max(0, self.head - self.__capacity)
+        else:
+            self.__next = self.head
+    
+    def __open(self):
+        """
+        Map the ring buffer and check its header.
+        """
+        
+        fd = os.open(self.__path, os.O_RDONLY)
+        
+        try:
+            newMap = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        
+        finally:
+            os.close(fd)
+        
+        magic, version, size, capacity = ringHeader.unpack_from(newMap, 0)
+        
+        if (magic != ringMagic) or (version != ringVersion) or (size != slotSize) or (len(newMap) < ringSlotsOffset + (capacity * slotSize)):
+            newMap.close()
+            raise ValueError("%s: %s is not a version %s ring buffer." %(self.__dName, self.__path, ringVersion))
+        
+        if self.__map is not None:
+            self.__map.close()
+        
+        self.__map = newMap
+        self.__capacity = capacity
+        self.__generation = ringGeneration.unpack_from(newMap, ringGenerationOffset)[0]
+    
+    def __restarted(self):
+        """
+        Has a new writer started since we mapped the ring?
+        """
+        
+        return ringGeneration.unpack_from(self.__map, ringGenerationOffset)[0] != self.__generation
+    
+    @property
+    def head(self):
+        """
+        How many records the writer has written.
+        """
+        
+        return ringHead.unpack_from(self.__map, ringHeadOffset)[0]
+    
+    @property
+    def missed(self):
+        """
+        How many records were overwritten before we read them.
+        """
+        
+        return self.__missed
+    
+    def available(self):
+        """
+        How many records are waiting to be read.
+        """
+        
+        return max(0, self.head - self.__next)
+    
+    def read(self, maxRecords=None):
+        """
+        Returns a list of new records as dictionaries like adm300archiveReader returns, plus their record number as seq.
+        """
+        
+        records = []
+        
+        # A new writer started over, maybe with a different capacity.
+        if self.__restarted():
+            self.__open()
+            self.__next = 0
+        
+        head = self.head
+        
+        # The writer started over.
+        if head < self.__next:
+            self.__next = 0
+        
+        # Fell too far behind? Skip to the oldest record still there.
+        if head - self.__next > self.__capacity:
+            self.__missed += head - self.__capacity - self.__next
+            self.__next = head - self.__capacity
+        
+        if maxRecords is not None:
+            head = min(head, self.__next + maxRecords)
+        
+        while self.__next < head:
+            num = self.__next
+            offset = ringSlotsOffset + ((num % self.__capacity) * slotSize)
+            
+            # Read the record between two looks at the slot sequence. If either one isn't what we expect the writer lapped us mid-read.
+            before = slotSeq.unpack_from(self.__map, offset)[0]
+            record = adm300archive.unpackRecord(self.__map, offset + slotSeq.size)
+            after = slotSeq.unpack_from(self.__map, offset)[0]
+            
+            self.__next = num + 1
+            
+            if (before != after) or (before != (num + 1) * 2):
+                self.__missed += 1
+                continue
+            
+            record['seq'] = num
+            records.append(record)
+        
+        # A new writer started while we were reading, so what we read may be from the wrong slots.
+        if self.__restarted():
+            self.__open()
+            self.__next = 0
+            
+            return []
+        
+        return records
+    
+    def wait(self, timeout=None, interval=0.001):
+        """
+        Wait for a new record. The writer never signals readers, so this polls, starting every interval seconds and backing off to every 50 ms. Returns whether there's something to read.
+        """
+        
+        deadline = None
+        
+        if timeout is not None:
+            deadline = time.time() + timeout
+        
+        while not self.available():
+            if (deadline is not None) and (time.time() >= deadline):
+                return False
+            
+            time.sleep(interval)
+            interval = min(interval * 2, 0.05)
+        
+        return True
+    
+    def close(self):
+        """
+        Stop reading.
+        """
+        
+        self.__map.close()
@@ -0,0 +1,383 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import errno
+import math
+import os
+import pty
+import random
+import select
+import string
+import threading
+import time
+import tty
+import adm300common
+import adm300parse
+
+class adm300sim:
+    def __init__(self, baud=300, rate=0.5, doseRt=0.0001, rateAlarmThresh=0.006, doseAlarmThresh=10.0, debug=False):
+        """
+        Virtual Canberra/NRC ADM-300 on a pseudo-terminal. Open devPath with adm300comm to talk to it. Sends rate sentences per second once reports are started, paced as if on a serial port running at baud. Set rate or baud to 0 to send as fast as possible.
+        """
+        
+        # Set class-wide properties.
+        self.__baud = baud
+        self.__rate = rate
+        self.__debug = debug
+        self.__dName = "adm300sim"
+        
+        # Device messages
+        self.__admPO = chr(0x01)
+        
+        # Simulated meter state.
+        self.__background = doseRt
+        self.__doseRt = doseRt
+        self.__doseAcc = 0.0
+        self.__rateAlarmThresh = rateAlarmThresh
+        self.__doseAlarmThresh = doseAlarmThresh
+        self.__rateAlarm = False
+        self.__doseAlarm = False
+        self.__reporting = False
+        self.__seqNo = 0
+        self.__lastTime = None
+        
+        # The debug field cycles through these IDs.
+        self.__dbgIDs = ["1", "2", "3", "4", "7", "8", "9", ":"]
+        
+        # Counters.
+        self.__sentCount = 0
+        self.__cmdCount = 0
+        
+        # Callbacks.
+        self.__sentCb = self.__dummy
+        self.__cmdCb = self.__dummy
+        
+        # This flag tells us if we should keep running.
+        self.__keepRunning = True
+        
+        # Parser, for computing checksums.
+        self.__ap = adm300parse.adm300parse()
+        
+        # Unprocessed command data.
+        self.__rxBuf = ""
+        
+        # Set up the pty. The master side is ours, the slave side looks like a serial port.
+        self.__master, self.__slave = pty.openpty()
+        tty.setraw(self.__slave)
+        self.__devPath = os.ttyname(self.__slave)
+        
+        # Simulator thread, once we've been powered on.
+        self.__simWk = None
+        
+        # Pipe used to wake the thread up.
+        self.__waker = adm300common.adm300wakePipe()
+    
+    @property
+    def devPath(self):
+        """
+        Path to the pseudo-terminal that acts as the ADM-300's serial port.
+        """
+        
+        return self.__devPath
+    
+    @property
+    def sentCount(self):
+        """
+        How many sentences we've sent.
+        """
+        
+        return self.__sentCount
+    
+    @property
+    def cmdCount(self):
+        """
+        How many commands we've received.
+        """
+        
+        return self.__cmdCount
+    
+    @property
+    def reporting(self):
+        """
+        Are we sending reports?
+        """
+        
+        return self.__reporting
+    
+    def __dummy(self, *args):
+        """
+        Dummy callback.
+        """
+        
+        return
+    
+    def setSentCallback(self, cb):
+        """
+        Set a callback function for sentences we send. It must accept three arguments: the sentence, its send sequence number starting at 1, and the time its last byte hit the wire.
+        """
+        
+        self.__sentCb = cb
+    
+    def setCmdCallback(self, cb):
+        """
+        Set a callback function for commands we receive. It must accept one argument: the command body.
+        """
+        
+        self.__cmdCb = cb
+    
+    def setDoseRt(self, doseRt):
+        """
+        Set the background dose rate the simulated readings wander around.
+        """
+        
+        self.__background = doseRt
+    
+    def encodeNumNotation(self, num):
+        """
+        Encode a number in NNNSE notation. This is the opposite of adm300parse.parseNumNotation.
+        """
+        
+        # Zero is sent with a negative exponent.
+        if num <= 0:
+            return "000-1"
+        
+        # Pick the exponent that gives us three significant digits.
+        exp = int(math.floor(math.log10(num))) + 3
+        mant = int(round(num / math.pow(10.0, exp - 5)))
+        
+        # Rounding can carry into a fourth digit.
+        if mant > 999:
+            mant = int(round(mant / 10.0))
+            exp += 1
+        
+        # Clamp to what one exponent digit can represent.
+        exp = max(-9, min(9, exp))
+        
+        if exp < 0:
+            signStr = "-"
+        else:
+            signStr = "+"
+        
+        return "%03d%s%d" %(mant, signStr, abs(exp))
+    
+    def makeSentence(self):
+        """
+        Advance the simulated meter and build the next data sentence. Useful on its own for building test corpora.
+        """
+        
+        now = time.time()
+        
+        # Wander around the background rate.
+        self.__doseRt = max(0.0, self.__doseRt + ((self.__background - self.__doseRt) * 0.1) + random.gauss(0, self.__background * 0.05))
+        doseRtUnf = max(0.0, self.__doseRt + random.gauss(0, self.__background * 0.2))
+        
+        # Accumulate dose since the last sentence.
+        if self.__lastTime is not None:
+            self.__doseAcc += self.__doseRt * (now - self.__lastTime) / 3600.0
+        
+        self.__lastTime = now
+        
+        # Alarms latch until they're acknowledged.
+        self.__rateAlarm = self.__rateAlarm or (self.__doseRt >= self.__rateAlarmThresh)
+        self.__doseAlarm = self.__doseAlarm or (self.__doseAcc >= self.__doseAlarmThresh)
+        
+        # Sequence numbers are two digits.
+        self.__seqNo = (self.__seqNo % 99) + 1
+        
+        # Flags.
+        flags = "%s%s.L" %("R" if self.__rateAlarm else ".", "D" if self.__doseAlarm else ".")
+        
+        # Debug field.
+        dbgID = self.__dbgIDs[self.__seqNo % len(self.__dbgIDs)]
+        
+        if dbgID == "1":
+            dbgDat = self.encodeNumNotation(self.__rateAlarmThresh)
+        elif dbgID == "2":
+            dbgDat = self.encodeNumNotation(self.__doseAlarmThresh)
+        elif dbgID == "3":
+            dbgDat = "49620"
+        else:
+            dbgDat = "00000"
+        
+        dbgRaw = "I00U2%sA440%s" %(random.choice(string.ascii_letters), dbgID)
+        
+        body = "%02da%s %s %s %s.%s %s " %(
+            self.__seqNo,
+            self.encodeNumNotation(self.__doseRt),
+            self.encodeNumNotation(self.__doseAcc),
+            self.encodeNumNotation(doseRtUnf),
+            flags,
+            dbgRaw,
+            dbgDat
+        )
+        
+        return "%s%02X]" %(body, self.__ap.computeChecksum(body))
+    
+    def __write(self, data):
+        """
+        Write data to the pty, returning how long it would take to send at our baud rate.
+        """
+        
+        sendTime = 0.0
+        
+        if self.__baud:
+            sendTime = len(data) * 10.0 / self.__baud
+        
+        while data:
+            try:
+                sent = os.write(self.__master, data)
+            
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                
+                raise
+            
+            data = data[sent:]
+        
+        return sendTime
+    
+    def __handleCmds(self, data):
+        """
+        Handle any complete commands in data we got from the pty.
+        """
+        
+        self.__rxBuf += data
+        
+        while True:
+            end = self.__rxBuf.find(adm300common.cmdEnd)
+            
+            if end < 0:
+                break
+            
+            # Commands are the non-whitespace between the prefix and tail.
+            cmd = self.__rxBuf[:end].strip()
+            self.__rxBuf = self.__rxBuf[end + 1:]
+            
+            if self.__debug: print("%s: Got command %s." %(self.__dName, cmd))
+            
+            self.__cmdCount += 1
+            
+            if cmd == adm300common.cmdStartMon:
+                self.__reporting = True
+                self.__seqNo = 0
+                self.__lastTime = None
+            
+            elif cmd == adm300common.cmdStopMon:
+                self.__reporting = False
+            
+            elif cmd == adm300common.cmdClearDose:
+                self.__doseAcc = 0.0
+                self.__doseAlarm = False
+            
+            elif cmd == adm300common.cmdAlarmAck:
+                self.__rateAlarm = False
+                self.__doseAlarm = False
+            
+            self.__cmdCb(cmd)
+        
+        # Don't let junk pile up.
+        self.__rxBuf = self.__rxBuf[-64:]
+    
+    def __simThread(self):
+        """
+        This thread acts like an ADM-300.
+        """
+        
+        if self.__debug: print("%s: Start sim thread on %s..." %(self.__dName, self.__devPath))
+        
+        # Power on.
+        self.__write(self.__admPO)
+        
+        nextTime = time.time()
+        
+        while self.__keepRunning:
+            # Wait for commands, or until the next sentence is due.
+            if self.__reporting:
+                timeout = max(0.0, nextTime - time.time())
+            else:
+                timeout = None
+            
+            try:
+                readable = select.select([self.__master, self.__waker.fd], [], [], timeout)[0]
+            
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                
+                raise
+            
+            if self.__waker.fd in readable:
+                self.__waker.drain()
+            
+            if self.__master in readable:
+                wasReporting = self.__reporting
+                self.__handleCmds(os.read(self.__master, 4096))
+                
+                # Start reporting right away.
+                if self.__reporting and not wasReporting:
+                    nextTime = time.time()
+            
+            if self.__reporting and (time.time() >= nextTime):
+                sentence = self.makeSentence()
+                
+                # A pty takes the whole sentence at once, and the reader can have it before the write returns, so this is when the last byte hits the wire.
+                sentTime = time.time()
+                sendTime = self.__write(sentence + "\r\n")
+                self.__sentCount += 1
+                self.__sentCb(sentence, self.__sentCount, sentTime)
+                
+                # Schedule the next one, but never faster than the baud rate allows.
+                if self.__rate:
+                    nextTime = max(nextTime + (1.0 / self.__rate), time.time() + sendTime)
+                else:
+                    nextTime = time.time() + sendTime
+        
+        if self.__debug: print("%s: Sim thread exiting..." %(self.__dName))
+    
+    def begin(self):
+        """
+        Power the simulated ADM-300 on.
+        """
+        
+        self.__simWk = threading.Thread(target=self.__simThread)
+        self.__simWk.daemon = True
+        self.__simWk.start()
+    
+    def kill(self):
+        """
+        Flag the simulator thread to stop running.
+        """
+        
+        self.__keepRunning = False
+        self.__waker.wake()
+    
+    def close(self):
+        """
+        Stop the simulator thread, wait for it to exit, and close the pseudo-terminal.
+        """
+        
+        self.kill()
+        
+        if self.__simWk is not None:
+            self.__simWk.join()
+            self.__simWk = None
+        
+        for fd in (self.__master, self.__slave):
+            os.close(fd)
+        
+        self.__waker.close()
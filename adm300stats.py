@@ -0,0 +1,169 @@
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import re
+import threading
+
+class adm300stats:
+    def __init__(self, prefix="adm300"):
+        """
+        Counters and timing histograms for adm300comm. Metrics have a name and an optional kind, such as the reason a parse failed. Histogram buckets are in seconds.
+        """
+        
+        self.__prefix = prefix
+        
+        # Upper bounds of histogram buckets, 1 us to 10 s.
+        self.__buckets = []
+        
+        for exp in range(-6, 2):
+            for mult in (1.0, 2.5, 5.0):
+                bound = float("%ge%d" %(mult, exp))
+                
+                if bound <= 10.0:
+                    self.__buckets.append(bound)
+        
+        # Counters and histograms by (name, kind).
+        self.__counters = {}
+        self.__hists = {}
+        
+        # Metrics can come from more than one thread.
+        self.__lock = threading.Lock()
+    
+    def incr(self, name, amount=1, kind=None):
+        """
+        Add to a counter.
+        """
+        
+        key = (name, kind)
+        
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + amount
+    
+    def observe(self, name, value, kind=None):
+        """
+        Add a sample to a histogram.
+        """
+        
+        key = (name, kind)
+        idx = bisect.bisect_left(self.__buckets, value)
+        
+        with self.__lock:
+            hist = self.__hists.get(key)
+            
+            if hist is None:
+                # One bucket for each bound plus one for everything bigger.
+                hist = {'counts': [0] * (len(self.__buckets) + 1), 'sum': 0.0, 'count': 0}
+                self.__hists[key] = hist
+            
+            hist['counts'][idx] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+    
+    def reset(self):
+        """
+        Clear all metrics.
+        """
+        
+        with self.__lock:
+            self.__counters = {}
+            self.__hists = {}
+    
+    def snapshot(self):
+        """
+        Returns a copy of all metrics as a dictionary. Counters are keyed by name then kind. Histograms have a count, a sum, and a list of (upper bound, cumulative count) buckets.
+        """
+        
+        retVal = {'counters': {}, 'histograms': {}}
+        
+        with self.__lock:
+            for (name, kind), count in self.__counters.items():
+                retVal['counters'].setdefault(name, {})[kind] = count
+            
+            for (name, kind), hist in self.__hists.items():
+                cumulative = []
+                total = 0
+                
+                for bound, count in zip(self.__buckets + [float('inf')], hist['counts']):
+                    total += count
+                    cumulative.append((bound, total))
+                
+                retVal['histograms'].setdefault(name, {})[kind] = {
+                    'count': hist['count'],
+                    'sum': hist['sum'],
+                    'buckets': cumulative
+                }
+        
+        return retVal
+    
+    def __metricName(self, name):
+        """
+        Turn a camelCase metric name into a Prometheus-style one.
+        """
+        
+        return "%s_%s" %(self.__prefix, re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', name).lower())
+    
+    def __labels(self, kind, extra=""):
+        """
+        Build a Prometheus label string.
+        """
+        
+        labels = []
+        
+        if kind is not None:
+            labels.append('kind="%s"' %(str(kind).replace('\\', '\\\\').replace('"', '\\"')))
+        
+        if extra:
+            labels.append(extra)
+        
+        if labels:
+            return "{%s}" %(",".join(labels))
+        
+        return ""
+    
+    def prometheus(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        
+        snap = self.snapshot()
+        lines = []
+        
+        for name in sorted(snap['counters']):
+            metric = "%s_total" %(self.__metricName(name))
+            lines.append("# TYPE %s counter" %(metric))
+            
+            for kind, count in sorted(snap['counters'][name].items()):
+                lines.append("%s%s %s" %(metric, self.__labels(kind), count))
+        
+        for name in sorted(snap['histograms']):
+            metric = self.__metricName(name)
+            lines.append("# TYPE %s histogram" %(metric))
+            
+            for kind, hist in sorted(snap['histograms'][name].items()):
+                for bound, count in hist['buckets']:
+                    if bound == float('inf'):
+                        le = "+Inf"
+                    else:
+                        le = "%g" %(bound)
+                    
+                    lines.append("%s_bucket%s %s" %(metric, self.__labels(kind, 'le="%s"' %(le)), count))
+                
+                lines.append("%s_sum%s %r" %(metric, self.__labels(kind), hist['sum']))
+                lines.append("%s_count%s %s" %(metric, self.__labels(kind), hist['count']))
+        
+        return "\n".join(lines) + "\n"
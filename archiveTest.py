@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+This file checks that adm300archiveWriter drops a torn record left at
+the end of an archive and keeps appending on record boundaries.
+"""
+
+import os
+import sys
+import tempfile
+import adm300archive
+import adm300parse
+
+adm300 = adm300parse.adm300parse()
+
+sentences = [
+    "01a232+1 143-1 209+1 R..L.I00U3aA4401 600-1 71]",
+    "02a230+1 155-1 235+1 R..L.I00U3rA4402 100+2 6A]",
+    "03a230+1 168-1 232+1 R..L.I00U3jA4403 49620 6A]",
+    "04a230+1 181-1 238+1 R..L.I00U3uA4404 00000 71]"
+]
+
+readings = [adm300.parseSentence(sentence) for sentence in sentences]
+
+fd, path = tempfile.mkstemp(suffix=".adm")
+os.close(fd)
+os.unlink(path)
+
+failed = False
+
+try:
+    writer = adm300archive.adm300archiveWriter(path)
+    writer.add(readings[0], 1.0)
+    writer.add(readings[1], 2.0)
+    writer.close()
+    
+    # Simulate a crash in the middle of writing a record.
+    with open(path, 'ab') as archiveFile:
+        archiveFile.write(b"\x01" * 10)
+    
+    writer = adm300archive.adm300archiveWriter(path)
+    writer.add(readings[2], 3.0)
+    writer.add(readings[3], 4.0)
+    writer.close()
+    
+    reader = adm300archive.adm300archiveReader(path)
+    records = [reader[num] for num in range(len(reader))]
+    reader.close()
+    
+    got = [(record['timestamp'], record['seqNo']) for record in records]
+    want = [(1.0, 1), (2.0, 2), (3.0, 3), (4.0, 4)]
+    
+    print("Records: %s" %(got))
+    
+    if got != want:
+        print("FAIL: expected %s" %(want))
+        failed = True
+    
+    if os.path.getsize(path) != adm300archive.archiveHeader.size + (4 * adm300archive.archiveRecord.size):
+        print("FAIL: archive size %s isn't a whole number of records." %(os.path.getsize(path)))
+        failed = True
+
+finally:
+    if os.path.exists(path):
+        os.unlink(path)
+
+if failed:
+    sys.exit(1)
+
+print("Torn tail dropped.")
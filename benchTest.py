@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+This file benchmarks parser throughput and end-to-end latency from
+the simulated ADM-300 writing a sentence to the adm300comm callback
+firing. Results are printed and written as JSON so they can be
+tracked over time.
+"""
+
+import argparse
+import json
+import time
+import timeit
+import adm300comm
+import adm300parse
+import adm300sim
+
+def percentiles(samples):
+    """
+    Summarize a list of samples.
+    """
+    
+    samples = sorted(samples)
+    
+    if not samples:
+        return {}
+    
+    def pct(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100.0))]
+    
+    return {
+        'count': len(samples),
+        'min': samples[0],
+        'p50': pct(50),
+        'p90': pct(90),
+        'p99': pct(99),
+        'p999': pct(99.9),
+        'max': samples[-1],
+        'mean': sum(samples) / len(samples)
+    }
+
+def timeRate(fn, items, rounds, batch, size=None):
+    """
+    Run fn over items for several rounds, timing each batch of items, and return per-batch items per second. If size is set it's called on each item to count how many things that item is, like the sentences in a batch.
+    """
+    
+    rates = []
+    
+    for i in range(rounds):
+        for first in range(0, len(items), batch):
+            chunk = items[first:first + batch]
+            start = timeit.default_timer()
+            
+            for item in chunk:
+                fn(item)
+            
+            elapsed = timeit.default_timer() - start
+            
+            if size is None:
+                done = len(chunk)
+            else:
+                done = sum(size(item) for item in chunk)
+            
+            if elapsed > 0:
+                rates.append(done / elapsed)
+    
+    return rates
+
+def benchParse(count, rounds, batch):
+    """
+    Parser throughput over a synthetic corpus.
+    """
+    
+    sim = adm300sim.adm300sim(baud=0, rate=0)
+    
+    try:
+        corpus = [sim.makeSentence() for i in range(count)]
+    
+    finally:
+        sim.close()
+    
+    tokens = [s[3:8] for s in corpus] + [s[9:14] for s in corpus] + [s[15:20] for s in corpus]
+    
+    # parseBatch gets one batch of sentences per call.
+    batches = [corpus[first:first + batch] for first in range(0, len(corpus), batch)]
+    
+    ap = adm300parse.adm300parse()
+    apCompact = adm300parse.adm300parse(compact=True)
+    
+    results = {
+        'parseSentence': percentiles(timeRate(ap.parseSentence, corpus, rounds, batch)),
+        'parseSentenceCompact': percentiles(timeRate(apCompact.parseSentence, corpus, rounds, batch)),
+        'parseNumNotation': percentiles(timeRate(ap.parseNumNotation, tokens, rounds, batch)),
+        'decodeNum': percentiles(timeRate(ap.decodeNum, tokens, rounds, batch)),
+        'parseBatch': percentiles(timeRate(ap.parseBatch, batches, rounds, 1, len))
+    }
+    
+    return results
+
+def benchLatency(count, rate):
+    """
+    End-to-end latency from the last byte of a sentence being written to the parsed callback firing.
+    """
+    
+    sent = {}
+    received = []
+    
+    sim = adm300sim.adm300sim(baud=0, rate=rate)
+    adc = adm300comm.adm300comm(dev=sim.devPath)
+    
+    # Remember each sentence and when its last byte was written, by send sequence number.
+    def onSent(sentence, sendNo, ts):
+        sent[sendNo] = (sentence, ts)
+    
+    # The pty delivers sentences in order, so the nth raw sentence we get is the nth one sent.
+    lastRaw = [None, 0]
+    
+    def onRaw(sentence):
+        lastRaw[0] = sentence
+        lastRaw[1] += 1
+    
+    def onLine(pLine):
+        received.append((lastRaw[1], lastRaw[0], time.time()))
+    
+    sim.setSentCallback(onSent)
+    adc.setRawCallback(onRaw)
+    adc.setCallback(onLine)
+    
+    adc.begin()
+    sim.begin()
+    
+    while not adc.gotPowerOn:
+        time.sleep(0.01)
+    
+    adc.startReports()
+    
+    # Wait for enough sentences, or give up.
+    deadline = time.time() + (count / float(rate)) + 10
+    
+    while (len(received) < count) and (time.time() < deadline):
+        time.sleep(0.1)
+    
+    adc.stopReports()
+    adc.kill()
+    sim.close()
+    
+    # Skip anything that doesn't line up with what was sent under the same sequence number.
+    latencies = []
+    
+    for sendNo, raw, rxTime in received:
+        if (sendNo in sent) and (sent[sendNo][0] == raw.strip()):
+            latencies.append((rxTime - sent[sendNo][1]) * 1000.0)
+    
+    return {'latencyMs': percentiles(latencies), 'rate': rate}
+
+parser = argparse.ArgumentParser(description="pyadm300 benchmarks.")
+parser.add_argument('--count', type=int, default=20000, help="Sentences in the parser corpus.")
+parser.add_argument('--rounds', type=int, default=5, help="Rounds of parser benchmarks.")
+parser.add_argument('--batch', type=int, default=100, help="Items per timed batch in the parser benchmarks.")
+parser.add_argument('--latency-count', type=int, default=1000, help="Sentences for the latency benchmark.")
+parser.add_argument('--latency-rate', type=float, default=200.0, help="Sentences per second for the latency benchmark.")
+parser.add_argument('--json', default="bench_output.txt", help="Where to write JSON results.")
+args = parser.parse_args()
+
+results = {
+    'timestamp': time.time(),
+    'parse': benchParse(args.count, args.rounds, args.batch),
+    'endToEnd': benchLatency(args.latency_count, args.latency_rate)
+}
+
+# Human-readable summary.
+for name, stats in sorted(results['parse'].items()):
+    print("%-22s p50 %12.0f/sec  max %12.0f/sec" %(name, stats['p50'], stats['max']))
+
+lat = results['endToEnd']['latencyMs']
+
+if lat:
+    print("End to end latency at %s/sec: p50 %.3f ms, p99 %.3f ms, max %.3f ms over %s sentences" %(results['endToEnd']['rate'], lat['p50'], lat['p99'], lat['max'], lat['count']))
+
+with open(args.json, 'w') as jsonFile:
+    json.dump(results, jsonFile, indent=2, sort_keys=True)
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+This file parses large raw ADM-300 captures on every core and either
+prints statistics about the readings in them or writes the readings
+to a CSV file.
+"""
+
+import argparse
+import json
+import time
+import adm300bulk
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse raw ADM-300 captures on every core.")
+    parser.add_argument('captures', nargs='+', help="Raw capture files.")
+    parser.add_argument('--csv', help="Write valid readings to this CSV file instead of printing statistics.")
+    parser.add_argument('--processes', type=int, default=None, help="Worker processes. Defaults to the number of cores.")
+    parser.add_argument('--chunk-size', type=int, default=4, help="Chunk size in MiB.")
+    parser.add_argument('--checksum', choices=['on', 'off'], default='on', help="Reject sentences with bad checksums.")
+    args = parser.parse_args()
+    
+    bulk = adm300bulk.adm300bulk(processes=args.processes, chunkSize=args.chunk_size * 1024 * 1024, checksum=(args.checksum == 'on'))
+    
+    start = time.time()
+    
+    if args.csv:
+        count = bulk.toCsv(args.captures, args.csv)
+    
+    else:
+        stats = bulk.stats(args.captures)
+        count = stats['sentences']
+        print(json.dumps(stats, indent=2, sort_keys=True))
+    
+    elapsed = time.time() - start
+    print("%s sentences in %.2f sec, %.0f/sec." %(count, elapsed, count / elapsed if elapsed > 0 else 0.0))
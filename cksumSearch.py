@@ -0,0 +1,193 @@
+#!/usr/bin/python
+
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+This file searches for the algorithm behind the checksum field of
+ADM-300 sentences. It tries sums, XORs, and CRC-8 variants over every
+byte range before the checksum, with final masks, offsets, and XORs,
+against sentences from raw capture files. The search is spread across
+all cores.
+
+Usage: cksumSearch.py capture.txt [capture2.txt ...]
+"""
+
+import multiprocessing
+import sys
+import adm300parse
+
+# Where the checksum is and how far it could cover.
+cksumStart = 44
+cksumEnd = 46
+
+# Final masks to try.
+masks = [0xff, 0x7f]
+
+# CRC-8 polynomials to try.
+crcPolys = [0x07, 0x1d, 0x2f, 0x31, 0x39, 0x49, 0x4d, 0x8d, 0x9b, 0xa7, 0xd5]
+
+def reflect8(val):
+    """
+    Reverse the bits of a byte.
+    """
+    
+    retVal = 0
+    
+    for bit in range(8):
+        if val & (1 << bit):
+            retVal |= 1 << (7 - bit)
+    
+    return retVal
+
+def crcTable(poly, reflected):
+    """
+    Build a CRC-8 lookup table.
+    """
+    
+    table = []
+    
+    for byte in range(256):
+        crc = byte
+        
+        for bit in range(8):
+            if reflected:
+                if crc & 0x01:
+                    crc = (crc >> 1) ^ reflect8(poly)
+                else:
+                    crc >>= 1
+            else:
+                if crc & 0x80:
+                    crc = ((crc << 1) ^ poly) & 0xff
+                else:
+                    crc = (crc << 1) & 0xff
+        
+        table.append(crc)
+    
+    return table
+
+# Algorithms are built once per process.
+algoCache = []
+
+def algorithms():
+    """
+    Every running-value algorithm we try. Each is a name, an initial value, and a step function.
+    """
+    
+    if algoCache:
+        return algoCache
+    
+    algos = [
+        ("sum", 0, lambda acc, b: acc + b),
+        ("xor", 0, lambda acc, b: acc ^ b)
+    ]
+    
+    for poly in crcPolys:
+        for reflected in (False, True):
+            table = crcTable(poly, reflected)
+            
+            for init in (0x00, 0xff):
+                name = "crc8 poly=0x%02x init=0x%02x reflected=%s" %(poly, init, reflected)
+                algos.append((name, init, lambda acc, b, table=table: table[acc ^ b]))
+    
+    algoCache.extend(algos)
+    
+    return algoCache
+
+def searchJob(job):
+    """
+    Try one algorithm starting at one byte against every end position. Returns a list of matching candidate descriptions.
+    """
+    
+    algoIdx, start, sentences = job
+    name, init, step = algorithms()[algoIdx]
+    
+    found = []
+    
+    # Running values per sentence as the range grows.
+    accs = [init] * len(sentences)
+    cksums = [int(s[cksumStart:cksumEnd], 16) for s in sentences]
+    
+    for end in range(start + 1, cksumStart + 1):
+        for i in range(len(sentences)):
+            accs[i] = step(accs[i], ord(sentences[i][end - 1]))
+        
+        for mask in masks:
+            for negate in (False, True):
+                vals = [((-acc) if negate else acc) & mask for acc in accs]
+                
+                # The first sentence tells us what the offset or output XOR would have to be.
+                offset = (cksums[0] - vals[0]) & mask
+                xorOut = cksums[0] ^ vals[0]
+                
+                desc = "%s over bytes [%s:%s] %smask=0x%02x" %(name, start, end, "negated " if negate else "", mask)
+                
+                if all(((v + offset) & mask) == c for v, c in zip(vals, cksums)):
+                    found.append("%s offset=0x%02x" %(desc, offset))
+                
+                if all((v ^ xorOut) == c for v, c in zip(vals, cksums)):
+                    found.append("%s xorOut=0x%02x" %(desc, xorOut))
+    
+    return found
+
+def loadSentences(paths):
+    """
+    Pull well-formed sentences out of raw capture files.
+    """
+    
+    ap = adm300parse.adm300parse(checksum=False)
+    sentences = []
+    
+    for path in paths:
+        with open(path, 'rb') as capture:
+            frames, remainder = ap.extractFrames(capture.read())
+        
+        for frame in frames:
+            try:
+                if ap.parseSentence(frame)['valid']:
+                    sentences.append(frame.strip())
+            
+            except ValueError:
+                # Garbage that happens to end in the right char.
+                None
+    
+    return sentences
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    
+    sentences = loadSentences(sys.argv[1:])
+    print("Searching with %s sentences on %s cores..." %(len(sentences), multiprocessing.cpu_count()))
+    
+    if len(sentences) < 2:
+        print("Need at least two sentences.")
+        sys.exit(1)
+    
+    jobs = [(algoIdx, start, sentences) for algoIdx in range(len(algorithms())) for start in range(cksumStart)]
+    
+    pool = multiprocessing.Pool()
+    matches = 0
+    
+    for found in pool.imap_unordered(searchJob, jobs):
+        for desc in found:
+            print(desc)
+            matches += 1
+    
+    pool.close()
+    pool.join()
+    
+    print("%s candidates match every sentence." %(matches))
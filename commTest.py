@@ -64,25 +64,11 @@ try:
     # Set the callback we want to use to handle the dictionary of data.
     adc.setCallback(printAll)
     
-    # Begin serial communication.
-    adc.begin()
-    
     print "Waiting for ADM-300 to be powered up..."
     
-    # Loop until we see the ADM-300 power up or get valid data...
-    while (not adc.gotPowerOn) and (not adc.gotSentence):
-        # Wait.
-        time.sleep(0.01)
-    
-    # If we haven't gotten reports yet...
-    if not adc.gotSentence:
-        print("Powered up. Waiting for ADM-300 to settle...")
-        time.sleep(5)
-        
-        print("Requesting readings...")
-        
-        # Ask the ADM-300 for reports...
-        adc.startReports()
+    # Begin serial communication and ask for readings as soon as the ADM-300 takes the command.
+    while not adc.connect(timeout=30):
+        print("Still waiting for the ADM-300...")
     
     # Loop until an exception is thrown or we fire a KeyboardInterrupt/SystemExit exception.
     while True:
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+
+This file checks that adm300comm holds commands while the last one is
+on the wire, so an alarm ack queued behind other commands goes out
+first and duplicate commands are coalesced.
+"""
+
+import sys
+import threading
+import time
+import adm300comm
+import adm300sim
+
+sim = adm300sim.adm300sim(baud=0, rate=0)
+
+# Commands in the order the simulated ADM-300 gets them.
+received = []
+sim.setCmdCallback(received.append)
+
+# At 300 baud each command takes 0.2 seconds on the wire, so everything after the first waits in the scheduler.
+adc = adm300comm.adm300comm(dev=sim.devPath, baud=300)
+
+# Make sure the serial thread is up before queueing anything.
+poweredOn = threading.Event()
+adc.setPowerOnCallback(poweredOn.set)
+
+adc.begin()
+sim.begin()
+poweredOn.wait(5)
+
+adc.stopReports()
+
+# Let X go out, then queue the rest while it's still on the wire.
+time.sleep(0.05)
+
+# A little apart, like commands from different parts of a program.
+for cmd in (adc.clearDose, adc.clearDose, adc.clearDose, adc.clearAlarm):
+    cmd()
+    time.sleep(0.01)
+
+time.sleep(1.5)
+
+adc.kill()
+sim.close()
+
+print("Commands: %s" %(received))
+
+# X goes out right away, then the ack jumps the queue and the three dose clears go out once.
+want = ["X", "g", "e"]
+
+if received != want:
+    print("FAIL: expected %s" %(want))
+    sys.exit(1)
+
+print("Alarm ack went first and duplicates were coalesced.")
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+This file shares the simulated ADM-300 with a few clients on
+localhost using adm300server and prints what the first one gets.
+"""
+
+import sys
+import time
+import adm300comm
+import adm300server
+import adm300sim
+
+# Sentences per second.
+rate = 50.0
+
+if len(sys.argv) > 1:
+    rate = float(sys.argv[1])
+
+sim = adm300sim.adm300sim(baud=0, rate=rate)
+adc = adm300comm.adm300comm(dev=sim.devPath)
+
+# Port 0 picks a free port.
+srv = adm300server.adm300server(("127.0.0.1", 0))
+srv.attach(adc)
+srv.begin()
+
+clients = [adm300server.adm300client(srv.address, timeout=5) for i in range(3)]
+
+adc.begin()
+sim.begin()
+
+while not adc.gotPowerOn:
+    time.sleep(0.01)
+
+adc.startReports()
+
+received = [0] * len(clients)
+start = time.time()
+
+while time.time() - start < 5:
+    for num, client in enumerate(clients):
+        for message in client.recv():
+            received[num] += 1
+            
+            if (num == 0) and isinstance(message, dict):
+                print("Reading %(seqNo)s: %(doseRt)s R/hr, %(doseAcc)s R" %message)
+
+adc.stopReports()
+adc.kill()
+sim.kill()
+srv.kill()
+
+print("Messages per client: %s" %(received))
+print("Server counters: %s" %(srv.counters))
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+
+This file checks that adm300shmReader opened with fromStart set
+after the writer has wrapped the ring starts with the oldest record
+still in it.
+"""
+
+import os
+import sys
+import tempfile
+import adm300parse
+import adm300shm
+
+adm300 = adm300parse.adm300parse()
+reading = adm300.parseSentence("01a232+1 143-1 209+1 R..L.I00U3aA4401 600-1 71]")
+
+fd, path = tempfile.mkstemp(suffix=".ring")
+os.close(fd)
+
+capacity = 8
+failed = False
+
+writer = adm300shm.adm300shmWriter(path, capacity=capacity)
+
+try:
+    # Wrap the ring a couple of times.
+    for num in range(20):
+        writer.add(reading, float(num))
+    
+    reader = adm300shm.adm300shmReader(path, fromStart=True)
+    records = reader.read()
+    reader.close()
+    
+    got = [(record['seq'], record['timestamp']) for record in records]
+    want = [(num, float(num)) for num in range(20 - capacity, 20)]
+    
+    print("Records: %s" %(got))
+    
+    if got != want:
+        print("FAIL: expected %s" %(want))
+        failed = True
+
+finally:
+    writer.close()
+
+if failed:
+    sys.exit(1)
+
+print("Reader started with the oldest record in the ring.")
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+
+"""
+This file is part of pyadm300 (https://github.com/ThreeSixes/pyadm300).
+
+pyadm300 is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+pyadm300 is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with pyadm300.  If not, see <http://www.gnu.org/licenses/>.
+
+This file demonstrates running adm300comm against the simulated
+ADM-300. Pass a rate in sentences per second to go faster than a
+real meter.
+"""
+
+import sys
+import time
+import traceback
+import adm300comm
+import adm300sim
+from pprint import pprint
+
+# Sentences per second and baud rate. A real ADM-300 is about 0.5 at 300 baud.
+rate = 0.5
+baud = 300
+
+if len(sys.argv) > 1:
+    rate = float(sys.argv[1])
+    baud = 0
+
+print("Start simulated ADM-300 test at %s sentences/sec. Press Ctrl+C to quit." %rate)
+
+try:
+    # Power the simulated meter up.
+    sim = adm300sim.adm300sim(baud=baud, rate=rate)
+    
+    # Talk to it like a real one.
+    adc = adm300comm.adm300comm(dev=sim.devPath)
+    
+    if rate <= 1:
+        adc.setCallback(pprint)
+    
+    sim.begin()
+    
+    # Start the serial thread and ask for readings as soon as the simulated ADM-300 is up.
+    print("Requesting readings...")
+    adc.connect()
+    
+    # Print throughput every 10 seconds.
+    lastCount = 0
+    
+    while True:
+        time.sleep(10)
+        print("%s sentences sent, %.1f/sec" %(sim.sentCount, (sim.sentCount - lastCount) / 10.0))
+        lastCount = sim.sentCount
+
+except (KeyboardInterrupt, SystemExit):
+    print("\nShutting down...")
+
+except:
+    print("Explosion:\n%s" %traceback.format_exc())
+
+finally:
+    try:
+        adc.stopReports()
+        adc.kill()
+        sim.kill()
+    
+    except:
+        None
+
+print("Finally exiting.")